@@ -1,136 +1,172 @@
 #!/usr/local/bin/python
 import json
-import boto3
 
 import uuid
 import re
+import os
 import sys
 import argparse
+import atexit
 from collections import OrderedDict
-from gardener.utils import jsonPP
-from gardener.logging import logError, logInfo, logRecycle, logSuccess, logDebug
+from gardener.utils import jsonPP, paginate
+from gardener.logging import logError, logInfo, logRecycle, logSuccess, logDebug, configureLogging
 from gardener.globals import CERT_POSTFIX, KEY_POSTFIX
-from gardener.gardener import Gardener
+from gardener.sharding import ShardedGardener
 from gardener.config import Config
+from gardener.executor import DEFAULT_WORKERS
+from gardener.provisioning import DEFAULT_PROVISIONING_WORKERS
+from gardener.fleet import Fleet, FAILED, expandConfigPaths
+from gardener.clients import ClientRegistry, defaultRegistry, setDefaultRegistry
+from gardener.metrics import Metrics
+from gardener.throttle import allStats
+from gardener.watch import DeploymentWatcher, DEFAULT_MAX_ERRORS
+from gardener.describe import GroupDescriber, VersionCache
+from gardener.cleanup import CleanupEngine
+from gardener.state import DeploymentState, DEFAULT_STATE_FILE, DEFAULT_MAX_AGE
 
-gg_client = boto3.client('greengrass')
+def ggClient():
+    return defaultRegistry().client('greengrass')
 
-def getLatestDeploymentStatus(groupName):
-    res = gg_client.list_groups()
-    group = [g for g in res['Groups'] if g['Name'] == groupName]
-    if len(group) == 0:
-        logError("No groups matching {0}".format(groupName))
-        return False
-    res = gg_client.list_deployments(GroupId=group[0]['Id'])
-    deployments = res['Deployments']
-    if len(deployments) == 0:
-        logError("No deployments found for group {0}".format(groupName))
-        return False
-    deployments = sorted(deployments, key=lambda x: x["CreatedAt"], reverse=True)
-    deploymentId = deployments[0]['Id']
-    res = gg_client.get_deployment_status(DeploymentId = deploymentId, GroupId=group[0]['Id'])
-    print("Latest deployment for group {0} is {1}".format(groupName, res['DeploymentStatus']))
+def writeMetrics(metrics, format, path):
+    report = metrics.toPrometheus() if format == 'prometheus' else metrics.toJson() + '\n'
+    if path:
+        with open(path, 'w') as f:
+            f.write(report)
+    else:
+        sys.stderr.write(report)
+
+def addStateArguments(parser):
+    parser.add_argument('--state', default=DEFAULT_STATE_FILE, help='local deployment state file')
+    parser.add_argument('--no-state', action='store_true', help='do not read nor write the local deployment state')
+    parser.add_argument('--state-max-age', type=int, default=DEFAULT_MAX_AGE, help='seconds after which a state entry is verified again')
+    parser.add_argument('--refresh', action='store_true', help='ignore the local deployment state and check everything remotely')
 
-def getCurrentConfiguration(groupId=None):
-    _regex = '.*{0}/(.*)/versions/(.*)'
-    _name = r'(\w+)DefinitionVersionArn'
-    func = {
-        'cores': lambda a, b : gg_client.get_core_definition_version(CoreDefinitionId = a, CoreDefinitionVersionId = b),
-        'devices': lambda a, b : gg_client.get_device_definition_version(DeviceDefinitionId = a, DeviceDefinitionVersionId = b),
-        'functions': lambda a, b : gg_client.get_function_definition_version(FunctionDefinitionId = a, FunctionDefinitionVersionId = b),
-        'logg_client.rs': lambda a, b : gg_client.get_logger_definition_version(LoggerDefinitionId = a, LoggerDefinitionVersionId = b),
-        'subscriptions': lambda a, b : gg_client.get_subscription_definition_version(SubscriptionDefinitionId = a, SubscriptionDefinitionVersionId = b)
-    }
-    groups = gg_client.list_groups()['Groups']
-    if groupId is None:
-        jsonPP(groups)
-        return
-    groupVersions = gg_client.list_group_versions(GroupId = groupId)['Versions']
-    latestGroupVersion = groupVersions[0]
-    groupDefinition = gg_client.get_group_version(GroupId = groupId, GroupVersionId = latestGroupVersion['Version'])['Definition']
-    jsonPP(groupDefinition)
-    for d in groupDefinition.keys():    
-        _entity = re.match(_name, d)[1].lower()+'s'
-        m = re.match(_regex.format(_entity), groupDefinition[d])
-        jsonPP(func[_entity](m[1],m[2])['Definition'])
-    return
+def addCredentialArguments(parser):
+    parser.add_argument('--credentials-dir', default='.', help='directory where the certificates and private keys are written')
+    parser.add_argument('--credentials-archive', choices=['tar', 'zip'], help='write the certificates and private keys of each group into one archive')
 
+def confirm(question):
+    sys.stderr.write(question + ' [y/N] ')
+    sys.stderr.flush()
+    return sys.stdin.readline().strip().lower() in ('y', 'yes')
 
-def cleanUpAll():
-    groupIds = [x['Id'] for x in gg_client.list_groups()['DefinitionInformationDefinition']]
-    coreDefinitionIds = [x['Id'] for x in gg_client.list_core_definitions()['DefinitionInformationDefinition']]
-    deviceDefinitionIds = [x['Id'] for x in gg_client.list_device_definitions()['DefinitionInformationDefinition']]
-    lambdaDefinitionIds = [x['Id'] for x in gg_client.list_lambda_definitions()['DefinitionInformationDefinition']]
-    subscriptionDefinitionIds = [x['Id'] for x in gg_client.list_subscription_definitions()['DefinitionInformationDefinition']]
-    loggerDefinitionIds = [x['Id'] for x in gg_client.list_logger.definitions()['DefinitionInformationDefinition']]
-    print('Cleaning up groups...')
-    for x in groupIds:
-        try:
-            print(x)
-            gg_client.delete_group(GroupId=x)
-        except:
-            print('Unable to delete')
-    print('Cleaning up cores...')
-    for x in coreDefinitionIds:
-        try:
-            print(x)
-            gg_client.delete_core_definition(CoreId=x)
-        except:
-            print('Unable to delete')
-    print('Cleaning up devices...')
-    for x in deviceDefinitionIds:
-        try:
-            print(x)
-            gg_client.delete_device_definition(DeviceId=x)
-        except:
-            print('Unable to delete')
-    print('Cleaning up lambdas...')
-    for x in lambdaDefinitionIds:
-        try:
-            print(x)
-            gg_client.delete_lambda_definition(LambdaId=x)
-        except:
-            print('Unable to delete')
-    print('Cleaning up subscriptions...')
-    for x in subscriptionDefinitionIds:
-        try:
-            print(x)
-            gg_client.delete_subscription_definition(SubscritpionId=x)
-        except:
-            print('Unable to delete')
-    print('Cleaning up loggers...')
-    for x in loggerDefinitionIds:
-        try:
-            print(x)
-            gg_client.delete_loggers_definition(LoggerId=x)
-        except:
-            print('Unable to delete')
+def stateFromArgs(args):
+    # The in-memory backend starts empty on every run, nothing recorded in a state file exists in it
+    if args.no_state or args.fake:
+        return None
+    return DeploymentState(args.state, args.state_max_age, args.refresh)
 
-    
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Greengrass Gardener')
     parser.add_argument('--config')
+    parser.add_argument('--fake', action='store_true', help='run against an in-memory Greengrass and IoT backend, without deployment state')
+    parser.add_argument('--fake-latency', type=float, default=0.0, help='seconds added to every call of the in-memory backend')
+    parser.add_argument('--fake-throttle-rate', type=float, default=0.0, help='fraction of the in-memory backend calls failing with ThrottlingException')
+    parser.add_argument('--log-level', choices=['debug', 'info', 'warning', 'error'], help='minimum level of the messages logged')
+    parser.add_argument('--log-format', choices=['text', 'json'], default='text', help='log messages as text or as JSON lines')
+    parser.add_argument('--metrics', choices=['json', 'prometheus'], help='report the API calls and deployment phases timings at the end of the run')
+    parser.add_argument('--metrics-file', help='write the metrics report to this file instead of stderr')
     subparsers = parser.add_subparsers(help='sub-command help', dest='subparser_name')
 
     parser_deploy = subparsers.add_parser('deploy', help='deploy help')
     parser_deploy.add_argument('--config')
+    parser_deploy.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='number of definitions built concurrently')
+    parser_deploy.add_argument('--provisioning-workers', type=int, default=DEFAULT_PROVISIONING_WORKERS, help='number of things provisioned concurrently')
+    parser_deploy.add_argument('--shard-workers', type=int, default=DEFAULT_WORKERS, help='number of groups deployed concurrently when the things are split in several groups')
+    addStateArguments(parser_deploy)
+    addCredentialArguments(parser_deploy)
+    parser_fleet = subparsers.add_parser('deploy-fleet', help='deploy one group per config file')
+    parser_fleet.add_argument('configs', nargs='+', help='config files, directories or glob patterns')
+    parser_fleet.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='number of groups deployed concurrently')
+    parser_fleet.add_argument('--definition-workers', type=int, default=1, help='number of definitions built concurrently per group')
+    parser_fleet.add_argument('--provisioning-workers', type=int, default=DEFAULT_PROVISIONING_WORKERS, help='number of things provisioned concurrently per group')
+    parser_fleet.add_argument('--output-dir', help='directory where the core config file of each group is written')
+    addStateArguments(parser_fleet)
+    addCredentialArguments(parser_fleet)
+    parser_watch = subparsers.add_parser('watch', help='follow the latest deployment of groups until they finish')
+    parser_watch.add_argument('groups', nargs='+', help='group names')
+    parser_watch.add_argument('--workers', type=int, default=8, help='number of concurrent status calls')
+    parser_watch.add_argument('--min-interval', type=float, default=2.0, help='seconds between polls while a status changes')
+    parser_watch.add_argument('--max-interval', type=float, default=30.0, help='maximum seconds between polls of a settled status')
+    parser_watch.add_argument('--timeout', type=float, help='stop watching after these many seconds')
+    parser_watch.add_argument('--max-errors', type=int, default=DEFAULT_MAX_ERRORS, help='consecutive status errors after which a group is given up')
     parser_ls = subparsers.add_parser('listGroups', help='listGroups help')
     parser_group = subparsers.add_parser('describeGroup', help='describeGroup help')
-    parser_group.add_argument('--id')
+    parser_group.add_argument('--id', action='append', help='group id, can be repeated')
+    parser_group.add_argument('--all', action='store_true', help='describe every group')
+    parser_group.add_argument('--workers', type=int, default=8, help='number of concurrent calls')
+    parser_group.add_argument('--cache-dir', help='directory of the definition versions cache')
+    parser_group.add_argument('--no-cache', action='store_true', help='do not read nor write the definition versions cache')
+    parser_clean = subparsers.add_parser('cleanUp', help='delete groups and definitions')
+    parser_clean.add_argument('--prefix', help='only delete groups and definitions whose name starts with this prefix')
+    parser_clean.add_argument('--orphaned-only', action='store_true', help='keep every group, only delete definitions no group references')
+    parser_clean.add_argument('--all', action='store_true', help='delete every group and definition of the account when no prefix is given')
+    parser_clean.add_argument('--dry-run', action='store_true', help='print the cleanup plan without deleting anything')
+    parser_clean.add_argument('--yes', action='store_true', help='delete without asking for confirmation')
+    parser_clean.add_argument('--workers', type=int, default=8, help='number of concurrent calls')
 
     args = parser.parse_args()
-    if args.config:
-        config = Config(args.config)
-        gg = Gardener(config)
-    else:
-        config = Config('config.json')
-        gg = Gardener(config)
+    configureLogging(args.log_level, args.log_format)
+    factory = None
+    if args.fake:
+        # The fake backend is a development aid, only loaded when asked for
+        from gardener.fake import FakeBackend
+        backend = FakeBackend(args.fake_latency, args.fake_throttle_rate)
+        factory = backend.factory
+        atexit.register(lambda: sys.stderr.write(json.dumps(dict(backend.callCounts()), indent=2, sort_keys=True) + '\n'))
+    metrics = None
+    if args.metrics or args.metrics_file:
+        metrics = Metrics(allStats)
+        atexit.register(writeMetrics, metrics, args.metrics, args.metrics_file)
+    if factory is not None or metrics is not None:
+        setDefaultRegistry(ClientRegistry(factory=factory, metrics=metrics))
     if args.subparser_name == 'deploy': 
-        print (gg.createGreengrass())
+        config = Config(args.config if args.config else 'config.json')
+        gg = ShardedGardener(config, args.workers, provisioningWorkers=args.provisioning_workers, state=stateFromArgs(args),
+            credentialsDir=args.credentials_dir, credentialsFormat=args.credentials_archive, shardWorkers=args.shard_workers)
+        configFiles = gg.createGreengrass()
+        if len(configFiles) == 1:
+            print (list(configFiles.values())[0])
+        else:
+            jsonPP(dict((k, json.loads(v)) for k, v in configFiles.items()))
+    elif args.subparser_name == 'deploy-fleet':
+        results = Fleet(expandConfigPaths(args.configs), args.workers, args.definition_workers, args.provisioning_workers, stateFromArgs(args), defaultRegistry(),
+            args.credentials_dir, args.credentials_archive).deploy()
+        if args.output_dir:
+            for r in results:
+                for group, content in r.configFiles.items():
+                    with open(os.path.join(args.output_dir, group+'_config.json'), 'w') as f:
+                        f.write(content)
+        jsonPP([r.toDict() for r in results])
+        if any(r.status == FAILED for r in results):
+            sys.exit(1)
+    elif args.subparser_name == 'watch':
+        watcher = DeploymentWatcher(ggClient(), args.groups, workers=args.workers, minInterval=args.min_interval, maxInterval=args.max_interval, maxErrors=args.max_errors)
+        statuses = watcher.watch(args.timeout)
+        if any(s != 'Success' for s in statuses.values()):
+            sys.exit(1)
+    elif args.subparser_name == 'cleanUp':
+        if not args.prefix and not args.all:
+            parser_clean.error('one of --prefix or --all is required')
+        engine = CleanupEngine(ggClient(), args.workers, args.prefix, args.orphaned_only)
+        plan = engine.plan()
+        jsonPP(plan.toDict())
+        if args.dry_run:
+            sys.exit(0)
+        count = len(plan.groups) + sum(len(v) for v in plan.definitions.values())
+        if count and not args.yes and not confirm('Delete {0} groups and definitions listed above?'.format(count)):
+            logError('Cleanup cancelled')
+            sys.exit(1)
+        if not engine.execute(plan):
+            sys.exit(1)
     elif args.subparser_name == 'listGroups':
-        getCurrentConfiguration()
+        jsonPP(paginate(ggClient().list_groups, 'Groups'))
     elif args.subparser_name == 'describeGroup':
-        getCurrentConfiguration(args.id)
+        if not args.all and not args.id:
+            parser_group.error('one of --id or --all is required')
+        cache = None if args.no_cache else VersionCache(args.cache_dir)
+        describer = GroupDescriber(ggClient(), cache, args.workers)
+        jsonPP(describer.describeAll() if args.all else describer.describe(args.id))
 
         
     
\ No newline at end of file
@@ -0,0 +1,73 @@
+import threading
+from .utils import dicSlice, paginate
+
+DEFINITION_KEYS = ['Id', 'LatestVersion', 'LatestVersionArn']
+
+
+class DefinitionCatalog:
+    """
+    Name index of the existing Greengrass groups and definitions.
+
+    Each kind (core, device, function, logger, subscription, group) is listed once, through all the
+    pages, the first time it is looked up. Entities created or updated during the run must be
+    recorded so that later lookups reflect them without listing again.
+    """
+    def __init__(self, gg):
+        self.gg = gg
+        self._lock = threading.Lock()
+        self._kindLocks = {}
+        self._index = {}
+
+    def _listKind(self, kind):
+        if kind == 'group':
+            return paginate(self.gg.list_groups, 'Groups')
+        return paginate(getattr(self.gg, 'list_{0}_definitions'.format(kind)), 'Definitions')
+
+    def _load(self, kind):
+        with self._lock:
+            kindLock = self._kindLocks.setdefault(kind, threading.Lock())
+        with kindLock:
+            if kind not in self._index:
+                index = {}
+                for x in self._listKind(kind):
+                    # Unnamed entries are kept under None, they are only returned by listAll
+                    index.setdefault(x.get('Name'), []).append(dicSlice(x, DEFINITION_KEYS))
+                self._index[kind] = index
+        return self._index[kind]
+
+    def find(self, kind, name):
+        """
+        Return the list of entries, sliced to Id, LatestVersion and LatestVersionArn, named name
+        """
+        if name is None:
+            return []
+        return list(self._load(kind).get(name, []))
+
+    def listAll(self, kind):
+        """
+        Return every entry of a kind, with its Name (None for unnamed entries)
+        """
+        index = self._load(kind)
+        with self._lock:
+            return [dict(x, Name=name) for name, entries in index.items() for x in entries]
+
+    def record(self, kind, name, entry):
+        """
+        Record a definition created or updated by gardener, replacing the entry with the same Id
+        """
+        index = self._load(kind)
+        entry = dicSlice(entry, DEFINITION_KEYS)
+        with self._lock:
+            entries = [x for x in index.get(name, []) if x['Id'] != entry['Id']]
+            entries.append(entry)
+            index[name] = entries
+
+    def invalidate(self, kind=None):
+        """
+        Drop the index of a kind, or of all kinds, so that it is listed again on the next lookup
+        """
+        with self._lock:
+            if kind is None:
+                self._index.clear()
+            else:
+                self._index.pop(kind, None)
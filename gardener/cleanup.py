@@ -0,0 +1,123 @@
+from concurrent.futures import ThreadPoolExecutor
+from .catalog import DefinitionCatalog
+from .describe import DEFINITION_KINDS, parseVersionArn
+from .logging import logError, logInfo, logSuccess
+
+class CleanupPlan:
+    """
+    What a cleanup deletes: the groups whose deployments are reset first, the groups,
+    then the definitions of every kind.
+    """
+    def __init__(self):
+        self.resets = []
+        self.groups = []
+        self.definitions = dict((k, []) for k in DEFINITION_KINDS)
+        # group id -> set of (kind, definition id) referenced by its latest version
+        self.references = {}
+
+    def toDict(self):
+        return {
+            'resetDeployments': [dict(Id=x['Id'], Name=x.get('Name')) for x in self.resets],
+            'groups': [dict(Id=x['Id'], Name=x.get('Name')) for x in self.groups],
+            'definitions': dict((k, [dict(Id=x['Id'], Name=x.get('Name')) for x in v]) for k, v in self.definitions.items() if v)
+        }
+
+
+class CleanupEngine:
+    """
+    Delete Greengrass groups and definitions in dependency order.
+
+    Every definition kind is listed through all its pages and the latest version of each group
+    is read to know which definitions it references. Deployments are reset where needed, then
+    groups and finally definitions are deleted on a pool of workers. A definition is never
+    deleted while a group that is kept, or that failed to be deleted, references it.
+
+    prefix limits the cleanup to the groups and definitions whose name starts with it.
+    orphanedOnly keeps every group and only deletes the definitions no group references.
+    """
+    def __init__(self, gg, workers=8, prefix=None, orphanedOnly=False, catalog=None):
+        self.gg = gg
+        self.workers = workers
+        self.prefix = prefix
+        self.orphanedOnly = orphanedOnly
+        self.catalog = catalog if catalog is not None else DefinitionCatalog(gg)
+        self.errors = {}
+
+    def _selected(self, entry):
+        return self.prefix is None or (entry.get('Name') or '').startswith(self.prefix)
+
+    def _groupReferences(self, group):
+        if 'LatestVersion' not in group:
+            return set()
+        definition = self.gg.get_group_version(GroupId=group['Id'], GroupVersionId=group['LatestVersion'])['Definition']
+        references = set()
+        for arn in definition.values():
+            parsed = parseVersionArn(arn)
+            if parsed is not None:
+                references.add(parsed[:2])
+        return references
+
+    def _hasDeployments(self, group):
+        return len(self.gg.list_deployments(GroupId=group['Id'], MaxResults='1')['Deployments']) > 0
+
+    def plan(self):
+        plan = CleanupPlan()
+        groups = self.catalog.listAll('group')
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            plan.references = dict(zip([g['Id'] for g in groups], pool.map(self._groupReferences, groups)))
+            if not self.orphanedOnly:
+                plan.groups = [g for g in groups if self._selected(g)]
+                plan.resets = [g for g, deployed in zip(plan.groups, pool.map(self._hasDeployments, plan.groups)) if deployed]
+            kinds = list(DEFINITION_KINDS)
+            definitions = dict(zip(kinds, pool.map(lambda k: self.catalog.listAll(DEFINITION_KINDS[k].lower()), kinds)))
+
+        deleted = set(g['Id'] for g in plan.groups)
+        kept = set()
+        for groupId, references in plan.references.items():
+            if groupId not in deleted:
+                kept.update(references)
+        for kind, entries in definitions.items():
+            plan.definitions[kind] = [x for x in entries if self._selected(x) and (kind, x['Id']) not in kept]
+        return plan
+
+    def _run(self, pool, label, items, method, params):
+        if not items:
+            return []
+
+        def call(item):
+            try:
+                method(**params(item))
+                return True
+            except Exception as e:
+                self.errors[item['Id']] = str(e)
+                logError('Unable to {0} {1} ({2}): {3}'.format(label, item['Id'], item.get('Name'), e))
+                return False
+        results = list(pool.map(call, items))
+        logInfo('{0}: {1} done, {2} failed'.format(label, results.count(True), results.count(False)))
+        return [x for x, ok in zip(items, results) if ok]
+
+    def execute(self, plan):
+        """
+        Apply the plan and return True if everything was deleted
+        """
+        self.errors = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            self._run(pool, 'reset deployments of group', plan.resets, self.gg.reset_deployments,
+                lambda g: {'GroupId': g['Id'], 'Force': True})
+            deleted = self._run(pool, 'delete group', plan.groups, self.gg.delete_group,
+                lambda g: {'GroupId': g['Id']})
+
+            remaining = set(g['Id'] for g in plan.groups) - set(g['Id'] for g in deleted)
+            blocked = set()
+            for groupId in remaining:
+                blocked.update(plan.references.get(groupId, set()))
+            for kind, entries in plan.definitions.items():
+                name = DEFINITION_KINDS[kind]
+                entries = [x for x in entries if (kind, x['Id']) not in blocked]
+                self._run(pool, 'delete {0} definition'.format(name.lower()), entries,
+                    getattr(self.gg, 'delete_{0}_definition'.format(name.lower())),
+                    lambda x, name=name: {name + 'DefinitionId': x['Id']})
+        self.catalog.invalidate()
+        if not self.errors:
+            logSuccess('Cleanup completed')
+        return not self.errors
@@ -0,0 +1,62 @@
+import threading
+from .throttle import wrapClient
+
+DEFAULT_MAX_POOL_CONNECTIONS = 50
+
+
+class ClientRegistry:
+    """
+    Create and hand out one client per (service, region), shared by every entity of the run.
+
+    boto3 is only imported when the first client is created. Clients come from a single boto3
+    session, use a connection pool sized for the concurrent workers and are wrapped by the shared
+    rate limiter, which is then the only one retrying calls. factory(service, region) can replace
+    boto3 to provide other clients. When metrics are given, every client is instrumented with them.
+    """
+    def __init__(self, maxPoolConnections=DEFAULT_MAX_POOL_CONNECTIONS, factory=None, metrics=None):
+        self.maxPoolConnections = maxPoolConnections
+        self.factory = factory
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._session = None
+        self._clients = {}
+
+    def _createClient(self, service, region):
+        if self.factory is not None:
+            return self.factory(service, region)
+        if self._session is None:
+            import boto3
+            self._session = boto3.session.Session()
+        from botocore.config import Config as BotoConfig
+        # The rate limiter retries throttled and failed calls, botocore must not retry them as well:
+        # no retry means a single attempt in every botocore version
+        return self._session.client(service, region_name=region or None,
+            config=BotoConfig(max_pool_connections=self.maxPoolConnections, retries={'max_attempts': 0}))
+
+    def client(self, service, region=None):
+        key = (service, region)
+        with self._lock:
+            if key not in self._clients:
+                client = self._createClient(service, region)
+                if self.metrics is not None:
+                    self.metrics.instrument(client, service)
+                self._clients[key] = wrapClient(client, service, region)
+            return self._clients[key]
+
+
+_defaultLock = threading.Lock()
+_default = None
+
+
+def defaultRegistry():
+    global _default
+    with _defaultLock:
+        if _default is None:
+            _default = ClientRegistry()
+        return _default
+
+
+def setDefaultRegistry(registry):
+    global _default
+    with _defaultLock:
+        _default = registry
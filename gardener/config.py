@@ -1,40 +1,220 @@
+import os
 import json
+import glob
+import threading
+from .templates import ThingTemplate, RouteTemplate
+
+# Sections that can be split in shard files, with the type of their content
+SHARDED_SECTIONS = {
+    'Cores': dict,
+    'Things': dict,
+    'Lambdas': dict,
+    'Policies': dict,
+    'Routes': list,
+    'Loggers': list
+}
+
+
+def _section(name):
+    def get(self):
+        if name in self._shards:
+            self._materialize(name)
+        return self._sections[name]
+
+    def set(self, value):
+        self._shards.pop(name, None)
+        self._sections[name] = value
+    return property(get, set)
+
+
+def _readShard(path, kind):
+    """
+    Stream the records of a shard: (id, value) pairs for dict sections, items for list sections.
+    .jsonl shards hold one record per line, an object with an "id" key for dict sections.
+    """
+    if path.endswith('.jsonl'):
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if kind is dict:
+                    id = record.pop('id')
+                    yield id, record
+                else:
+                    yield record
+    else:
+        with open(path) as f:
+            content = json.load(f)
+        if kind is dict:
+            for item in content.items():
+                yield item
+        else:
+            for item in content:
+                yield item
+
 
 class Config:
     """
     Represent the Gardener configuration.Can be created programmatically via the accessory methods
     or it can be loaded from a json config file
+
+    A config file can also be a manifest including shard files for the large sections:
+        "Include": {
+            "Things": ["things/*.json"],
+            "Routes": ["routes/*.jsonl"]
+        }
+    Patterns are relative to the manifest. Included sections are only read when first accessed,
+    and iterThings/iterRoutes/iterSection stream them record by record without keeping them.
+
+    Things and Routes can also be generated from templates, expanded in the same lazy way:
+        "ThingTemplates": {"sensors": {"id": "sensor{i}", "name": "site_sensor{i}", "range": [0, 1000], "policy": "p"}},
+        "RouteTemplates": [{"forEach": "sensors", "Source": "thing:{id}", "Subject": "data/{id}", "Target": "cloud"}]
+    See templates.ThingTemplate and templates.RouteTemplate.
+
+    Things that do not fit in one group are deployed as several groups, see sharding.ShardPlan.
+    The limit and the locality key can be set with:
+        "Sharding": {"maxThings": 1000, "key": "{site}"}
     """
-    Cores = {}
-    Group = {}
-    Things = {}
-    Region = ''
-    Lambdas = {}
-    Routes = []
-    Loggers = []
-    Policies = {}
+    Cores = _section('Cores')
+    Things = _section('Things')
+    Lambdas = _section('Lambdas')
+    Routes = _section('Routes')
+    Loggers = _section('Loggers')
+    Policies = _section('Policies')
 
     def __init__(self, file=None):
+        self.Group = {}
+        self.Region = ''
+        self._sections = dict((k, v()) for k, v in SHARDED_SECTIONS.items())
+        self._shards = {}
+        self.ThingTemplates = {}
+        self.RouteTemplates = []
+        self.Sharding = {}
+        self._lock = threading.Lock()
+        self._endpoints = None
         if file is None:
             return
+        self.load(file)
 
+    def load(self, file):
         with open(file) as f:
             dictionary = json.load(f)
 
+        include = dictionary.pop('Include', {})
+        thingTemplates = dictionary.pop('ThingTemplates', {})
+        routeTemplates = dictionary.pop('RouteTemplates', [])
         for k, v in dictionary.items():
             setattr(self, k, v)
 
-    def load(self, file):
-        with open(file) as f:
-            dictionary = json.load(f)
+        base = os.path.dirname(os.path.abspath(file))
+        for name, spec in thingTemplates.items():
+            self._addSource('Things', ThingTemplate(name, spec, base))
+            self.ThingTemplates[name] = self._shards['Things'][-1]
+        for spec in routeTemplates:
+            self._addRouteTemplate(RouteTemplate(spec, self.ThingTemplates))
+        for name, patterns in include.items():
+            if name not in SHARDED_SECTIONS:
+                raise ValueError('Section {0} cannot be included'.format(name))
+            if not isinstance(patterns, list):
+                patterns = [patterns]
+            files = []
+            for pattern in patterns:
+                matches = sorted(glob.glob(os.path.join(base, pattern)))
+                if not matches:
+                    raise ValueError('No shard matches {0}'.format(pattern))
+                files.extend(matches)
+            # Sections can have inline content as well, shards are appended to it
+            self._shards[name] = self._shards.get(name, []) + files
+        self._endpoints = None
 
-        for k, v in dictionary.items():
-            setattr(self, k, v)
+    def _addSource(self, name, source):
+        # Once read, a section is materialized again from its content and the new source
+        self._shards[name] = self._shards.get(name, []) + [source]
+
+    def iterSection(self, name):
+        """
+        Iterate over a section, streaming the shards and templates not loaded yet
+        """
+        kind = SHARDED_SECTIONS[name]
+        inline = self._sections[name]
+        for item in (inline.items() if kind is dict else inline):
+            yield item
+        for source in self._shards.get(name, []):
+            records = _readShard(source, kind) if isinstance(source, str) else source.records()
+            for record in records:
+                yield record
+
+    def iterThings(self):
+        return self.iterSection('Things')
+
+    def iterRoutes(self):
+        return self.iterSection('Routes')
+
+    def _materialize(self, name):
+        with self._lock:
+            if name not in self._shards:
+                return
+            if SHARDED_SECTIONS[name] is dict:
+                content = dict(self.iterSection(name))
+            else:
+                content = list(self.iterSection(name))
+            self._sections[name] = content
+            self._shards.pop(name)
+
+    def _endpointIndex(self):
+        """
+        Set of the valid route endpoints, maintained by addThing(s) and addLambda and rebuilt
+        only when Things or Lambdas have been replaced
+        """
+        if self._endpoints is None or self._indexed[0] is not self.Things or self._indexed[1] is not self.Lambdas:
+            self._endpoints = set(['GGShadowService', 'cloud'])
+            self._endpoints.update('thing:'+x for x in self.Things.keys())
+            self._endpoints.update('lambda:'+x for x in self.Lambdas.keys())
+            self._indexed = (self.Things, self.Lambdas)
+        return self._endpoints
+
+    def _routeErrors(self, source, subject, target, endpoints=None):
+        if endpoints is None:
+            endpoints = self._endpointIndex()
+        errors = []
+        if source not in endpoints:
+            errors.append('Source not defined')
+        if target not in endpoints:
+            errors.append('Target not defined')
+        if subject.startswith('shadow') and 'thing:'+subject.split(':')[1] not in endpoints:
+            errors.append('Shadow not defined')
+        return errors
+
+    def checkRouteTemplates(self):
+        """
+        Validate the routes generated by the route templates, which cannot be validated when the
+        templates are added. The things are streamed, not loaded. Raise a ValueError listing the
+        errors of every template.
+        """
+        if not self.RouteTemplates:
+            return
+        endpoints = set(['GGShadowService', 'cloud'])
+        endpoints.update('thing:'+k for k, v in self.iterThings())
+        endpoints.update('lambda:'+x for x in self.Lambdas.keys())
+        errors = []
+        for i, template in enumerate(self.RouteTemplates):
+            failed = 0
+            first = None
+            for r in template.records():
+                routeErrors = self._routeErrors(r['Source'], r['Subject'], r['Target'], endpoints)
+                if routeErrors:
+                    failed += 1
+                    first = first or 'Route {0} -> {1} ({2}): {3}'.format(r['Source'], r['Target'], r['Subject'], ', '.join(routeErrors))
+            if failed:
+                errors.append('Route template {0} (forEach {1}): {2} invalid routes, first: {3}'.format(i, template.spec['forEach'], failed, first))
+        if errors:
+            raise ValueError('\n'.join(errors))
 
     def addCore(self, id=None, name=None, syncShadow=None, policy=None):
         if len(self.Cores) > 0:
             raise ValueError("Too many cores")
-        if policy not in self.Policies.keys():
+        if policy not in self.Policies:
             raise ValueError("Policy not found")
         self.Cores[id] = {
             "name": name,
@@ -49,35 +229,103 @@ class Config:
             "deploy": deploy
         }
     
+    def addSharding(self, maxThings=None, key=None):
+        self.Sharding = {}
+        if maxThings is not None:
+            self.Sharding['maxThings'] = maxThings
+        if key is not None:
+            self.Sharding['key'] = key
+
     def addThing(self, id=None, name=None, syncShadow=False, policy=None):
-        if policy not in self.Policies.keys():
+        if policy not in self.Policies:
             raise ValueError("Policy not found")
+        endpoints = self._endpointIndex()
         self.Things[id] = {
             "name": name,
             "syncShadow": syncShadow,
             "policy": policy
         }
-    
+        endpoints.add('thing:'+id)
+
+    def addThings(self, things):
+        """
+        Add many things at once. things is an iterable of dictionaries with the addThing
+        parameters (id, name, syncShadow, policy). All the things are validated first and
+        nothing is added if any of them is invalid; the ValueError lists every error.
+        """
+        things = list(things)
+        errors = ['Thing {0}: Policy not found'.format(t.get('id')) for t in things if t.get('policy') not in self.Policies]
+        if errors:
+            raise ValueError('\n'.join(errors))
+        endpoints = self._endpointIndex()
+        for t in things:
+            self.Things[t['id']] = {
+                "name": t.get('name'),
+                "syncShadow": t.get('syncShadow', False),
+                "policy": t['policy']
+            }
+            endpoints.add('thing:'+t['id'])
+
+    def addThingTemplate(self, name=None, id=None, thingName=None, policy=None, syncShadow=False, range=None, csv=None):
+        """
+        Add the things generated by a template, see templates.ThingTemplate. The things are only
+        generated when Things is read or iterated.
+        """
+        if policy not in self.Policies:
+            raise ValueError("Policy not found")
+        spec = {'id': id, 'name': thingName, 'policy': policy, 'syncShadow': syncShadow}
+        if range is not None:
+            spec['range'] = list(range)
+        if csv is not None:
+            spec['csv'] = csv
+        template = ThingTemplate(name, spec)
+        self._addSource('Things', template)
+        self.ThingTemplates[name] = template
+        self._endpoints = None
+
+    def addRouteTemplate(self, forEach=None, source=None, subject=None, target=None):
+        """
+        Add a route for every thing of the thing template forEach, see templates.RouteTemplate.
+        The routes are validated by checkRouteTemplates.
+        """
+        self._addRouteTemplate(RouteTemplate({'forEach': forEach, 'Source': source, 'Subject': subject, 'Target': target}, self.ThingTemplates))
+
+    def _addRouteTemplate(self, template):
+        # The generated routes are validated by checkRouteTemplates, once every thing is known
+        self._addSource('Routes', template)
+        self.RouteTemplates.append(template)
+
     def addLambda(self, id=None, arn=None, functionConfiguration=None):
+        endpoints = self._endpointIndex()
         self.Lambdas[id] = {
             "arn": arn,
             "FunctionConfiguration": functionConfiguration
         }
+        endpoints.add('lambda:'+id)
 
     def addRoute(self, source=None, subject=None, target=None):
-        things = ['thing:'+x for x in self.Things.keys()]
-        lambdas = ['lambda:'+x for x in self.Lambdas.keys()]
-        if source not in things+lambdas+['GGShadowService', 'cloud']:
-            raise ValueError('Source not defined')
-        if target not in things+lambdas+['GGShadowService', 'cloud']:
-            raise ValueError('Target not defined')
-        if subject.startswith('shadow') and subject.split(':')[1] not in self.Things.keys():
-            raise ValueError('Shadow not defined')
+        errors = self._routeErrors(source, subject, target)
+        if errors:
+            raise ValueError(errors[0])
         self.Routes.append({
             "Source": source,
             "Subject": subject,
             "Target": target
         })
+
+    def addRoutes(self, routes):
+        """
+        Add many routes at once. routes is an iterable of dictionaries in the configuration
+        format (Source, Subject, Target). All the routes are validated first and nothing is
+        added if any of them is invalid; the ValueError lists every error.
+        """
+        routes = [{"Source": r['Source'], "Subject": r['Subject'], "Target": r['Target']} for r in routes]
+        errors = []
+        for i, r in enumerate(routes):
+            errors.extend('Route {0}: {1}'.format(i, e) for e in self._routeErrors(r['Source'], r['Subject'], r['Target']))
+        if errors:
+            raise ValueError('\n'.join(errors))
+        self.Routes.extend(routes)
     
     def addGreengrassSystemLogger(self, level=None, space=None, logtype=None ):
         self.Loggers = [x for x in self.Loggers if x["Component"] != "GreengrassSystem"].append({
@@ -1,6 +1,7 @@
 from .entity import EntityDefinition
 from .thing import Thing
-from itertools import chain
+from .provisioning import BulkProvisioner
+from .model import ThingSpec
 import json
 from .logging import logError, logInfo, logRecycle, logSuccess, logDebug
 
@@ -9,23 +10,38 @@ class CoreDefinition(EntityDefinition):
     Create a new Core definition if it does not already exists.
     Compare LatestVersion with new model configuration to avoid creating identical versions
     """
-    def __init__(self, gg, config):
-        EntityDefinition.__init__(self, gg, config)
+    def __init__(self, gg, config, catalog=None, policies=None, state=None, clients=None, credentials=None, plan=None):
+        EntityDefinition.__init__(self, gg, config, catalog, state, plan)
+        self.policies = policies
+        self.clients = clients
+        self.credentials = credentials
         self.entityName = "core"
 
     def getPostfix(self):
         return "_core_definition"
 
-    def getModelDefinition(self):
+    def _registry(self):
+        return self.plan.registry('cores') if self.plan is not None else None
+
+    def restore(self, deployed):
         coreKey = list(self.config.Cores.keys())[0]
-        thing = Thing(self.config)
+        registry = self._registry()
+        coreThing = registry.get(ThingSpec.fromConfig(coreKey, self.config.Cores[coreKey])) if registry is not None else None
+        if coreThing is None:
+            return False
         self.thingName = self.config.Cores[coreKey]['name']
-        self.coreThing = thing.createThing(self.thingName, self.config.Cores[coreKey]['policy'])
-        things = [dict(chain(self.coreThing.items(), v.items(), {'id': k}.items())) for k,v in self.config.Cores.items()]
-        return thing.getThingDefinition(things)
+        self.coreThing = coreThing
+        return True
 
-    def getExistingDefinitions(self):
-        return self.gg.list_core_definitions()['Definitions']
+    def getModelDefinition(self):
+        coreKey = list(self.config.Cores.keys())[0]
+        thing = Thing(self.config, self.policies, self.clients, self.credentials)
+        self.thingName = self.config.Cores[coreKey]['name']
+        provisioned = BulkProvisioner(thing, 1, registry=self._registry()).provision([(coreKey, self.config.Cores[coreKey])])
+        if coreKey not in provisioned:
+            raise NameError('Core thing {0} could not be provisioned'.format(self.thingName))
+        self.coreThing = provisioned[coreKey]
+        return thing.getThingDefinition([self.coreThing])
 
     def createEntityDefinition(self, name):
         return self.gg.create_core_definition(Name=name)
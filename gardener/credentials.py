@@ -0,0 +1,231 @@
+import io
+import os
+import time
+import queue
+import tarfile
+import zipfile
+import tempfile
+import threading
+from .globals import CERT_POSTFIX, KEY_POSTFIX
+from .logging import logError, logDebug
+
+DEFAULT_FSYNC_BATCH = 64
+ARCHIVE_FORMATS = {
+    'tar': '.tar.gz',
+    'zip': '.zip'
+}
+
+
+def _fsyncDirectory(directory):
+    # Makes the renames durable, directories cannot be opened on every platform
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except (OSError, AttributeError):
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class CredentialStore:
+    """
+    Base class of the stores of generated certificates and private keys.
+
+    put() hands the credentials of a thing to a background writer thread, so that provisioning
+    workers never wait for the disk, unless maxPending writes are already queued. close() waits
+    for every queued write and raises a RuntimeError if any of them failed: the private keys are
+    not available anywhere else. With background=False, put() writes immediately.
+    """
+    def __init__(self, background=True, maxPending=1024):
+        self.errors = {}
+        self.written = 0
+        self._closed = False
+        self._queue = None
+        if background:
+            self._queue = queue.Queue(maxPending)
+            self._thread = threading.Thread(target=self._run, name='credential-writer', daemon=True)
+            self._thread.start()
+
+    def put(self, name, cert, privkey):
+        if self._closed:
+            raise RuntimeError('Credential store is closed')
+        if self._queue is None:
+            self._store(name, cert, privkey)
+        else:
+            self._queue.put((name, cert, privkey))
+
+    def _store(self, name, cert, privkey):
+        try:
+            self._write(name, cert, privkey)
+            self.written += 1
+        except Exception as e:
+            self.errors[name] = str(e)
+            logError('Credentials of {0} could not be written: {1}'.format(name, e))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            self._store(*item)
+
+    def close(self):
+        """
+        Write every pending credential, idempotent
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._queue is not None:
+            self._queue.put(None)
+            self._thread.join()
+        try:
+            self._finish()
+        except Exception as e:
+            self.errors['*'] = str(e)
+        if self.errors:
+            raise RuntimeError('Credentials of {0} things could not be written: {1}'.format(
+                len(self.errors), ', '.join(sorted(self.errors))))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _write(self, name, cert, privkey):
+        raise NotImplementedError()
+
+    def _finish(self):
+        pass
+
+
+class FileCredentialStore(CredentialStore):
+    """
+    Write <name>_cert.pem and <name>_key.pem into directory.
+
+    Every file is written to a temporary file readable by its owner only and renamed once synced,
+    so a crash never leaves a partial key behind. Files are synced and renamed by batches of
+    fsyncBatch files, the directory is synced once per batch.
+    """
+    def __init__(self, directory='.', fsyncBatch=DEFAULT_FSYNC_BATCH, background=True):
+        self.directory = directory
+        self.fsyncBatch = max(1, fsyncBatch)
+        self._pending = []
+        os.makedirs(directory, exist_ok=True)
+        CredentialStore.__init__(self, background)
+
+    def _writeFile(self, filename, content):
+        # mkstemp creates the file readable and writable by its owner only
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.' + filename)
+        f = os.fdopen(fd, 'w')
+        try:
+            f.write(content)
+            f.flush()
+        except Exception:
+            f.close()
+            os.remove(tmp)
+            raise
+        self._pending.append((f, tmp, os.path.join(self.directory, filename)))
+
+    def _write(self, name, cert, privkey):
+        self._writeFile(name + CERT_POSTFIX, cert)
+        self._writeFile(name + KEY_POSTFIX, privkey)
+        if len(self._pending) >= self.fsyncBatch:
+            self._sync()
+
+    def _sync(self):
+        pending, self._pending = self._pending, []
+        for f, tmp, path in pending:
+            os.fsync(f.fileno())
+            f.close()
+            os.replace(tmp, path)
+        if pending:
+            _fsyncDirectory(self.directory)
+            logDebug('Synced {0} credential files'.format(len(pending)))
+
+    def _finish(self):
+        self._sync()
+
+
+class ArchiveCredentialStore(CredentialStore):
+    """
+    Write the certificates and private keys into a single tar.gz or zip archive at path.
+
+    The archive is built in a temporary file readable by its owner only and renamed into place
+    when the store is closed. The files of an existing archive are kept unless they were written
+    again, and the existing archive is left untouched when nothing was written.
+    """
+    def __init__(self, path, format='tar', background=True):
+        if format not in ARCHIVE_FORMATS:
+            raise ValueError('Unknown archive format {0}'.format(format))
+        self.path = path
+        self.format = format
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, self._tmp = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path))
+        os.close(fd)
+        self._names = set()
+        if format == 'zip':
+            self._archive = zipfile.ZipFile(self._tmp, 'w', zipfile.ZIP_DEFLATED)
+        else:
+            self._archive = tarfile.open(self._tmp, 'w:gz')
+        CredentialStore.__init__(self, background)
+
+    def _addFile(self, filename, content):
+        self._names.add(filename)
+        data = content.encode() if isinstance(content, str) else content
+        if self.format == 'zip':
+            info = zipfile.ZipInfo(filename, time.localtime()[:6])
+            info.external_attr = 0o600 << 16
+            info.compress_type = zipfile.ZIP_DEFLATED
+            self._archive.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(filename)
+            info.size = len(data)
+            info.mode = 0o600
+            info.mtime = time.time()
+            self._archive.addfile(info, io.BytesIO(data))
+
+    def _write(self, name, cert, privkey):
+        self._addFile(name + CERT_POSTFIX, cert)
+        self._addFile(name + KEY_POSTFIX, privkey)
+
+    def _existingFiles(self):
+        if self.format == 'zip':
+            with zipfile.ZipFile(self.path) as archive:
+                for name in archive.namelist():
+                    yield name, archive.read(name)
+        else:
+            with tarfile.open(self.path, 'r:gz') as archive:
+                for member in archive.getmembers():
+                    if member.isfile():
+                        yield member.name, archive.extractfile(member).read()
+
+    def _finish(self):
+        if not self._names:
+            self._archive.close()
+            os.remove(self._tmp)
+            return
+        if os.path.exists(self.path):
+            for name, data in self._existingFiles():
+                if name not in self._names:
+                    self._addFile(name, data)
+        self._archive.close()
+        with open(self._tmp, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(self._tmp, self.path)
+        _fsyncDirectory(os.path.dirname(os.path.abspath(self.path)))
+
+
+def openCredentialStore(directory='.', format=None, group=None):
+    """
+    Return a store writing the credential files into directory, or into the <group>_credentials
+    archive in directory when format is 'tar' or 'zip'
+    """
+    if format is None:
+        return FileCredentialStore(directory)
+    return ArchiveCredentialStore(os.path.join(directory, '{0}_credentials{1}'.format(group, ARCHIVE_FORMATS.get(format, ''))), format)
@@ -0,0 +1,132 @@
+import os
+import re
+import json
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from .catalog import DefinitionCatalog
+
+# Definition kinds as they appear in the version arns, with the name used by the API
+DEFINITION_KINDS = {
+    'cores': 'Core',
+    'devices': 'Device',
+    'functions': 'Function',
+    'loggers': 'Logger',
+    'subscriptions': 'Subscription',
+    'resources': 'Resource',
+    'connectors': 'Connector'
+}
+
+_versionArnRegex = re.compile(r'.*/definition/(?P<kind>\w+)/(?P<id>[^/]+)/versions/(?P<version>[^/]+)$')
+
+
+def parseVersionArn(arn):
+    """
+    Return (kind, definition id, version id) of a definition version arn, or None
+    """
+    m = _versionArnRegex.match(arn)
+    if m is None or m.group('kind') not in DEFINITION_KINDS:
+        return None
+    return m.group('kind'), m.group('id'), m.group('version')
+
+
+def defaultCacheDir():
+    base = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base, 'gardener', 'versions')
+
+
+class VersionCache:
+    """
+    On-disk cache of group and definition versions, keyed by version arn.
+    Versions are immutable once created, so entries never expire.
+    """
+    def __init__(self, directory=None):
+        self.directory = directory if directory is not None else defaultCacheDir()
+
+    def _path(self, arn):
+        return os.path.join(self.directory, hashlib.sha256(arn.encode()).hexdigest() + '.json')
+
+    def get(self, arn):
+        try:
+            with open(self._path(arn)) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def put(self, arn, definition):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.version')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(definition, f)
+        os.replace(tmp, self._path(arn))
+
+
+class GroupDescriber:
+    """
+    Fetch the latest version of groups and every definition version they reference.
+
+    All the calls of a stage run concurrently, across groups, and versions already in the
+    cache are not fetched again.
+    """
+    def __init__(self, gg, cache=None, workers=8, catalog=None):
+        self.gg = gg
+        self.cache = cache
+        self.workers = workers
+        self.catalog = catalog if catalog is not None else DefinitionCatalog(gg)
+
+    def _cached(self, arn, fetch):
+        if self.cache is not None:
+            definition = self.cache.get(arn)
+            if definition is not None:
+                return definition
+        definition = fetch()
+        if self.cache is not None:
+            self.cache.put(arn, definition)
+        return definition
+
+    def _getGroup(self, groupId):
+        res = self.gg.get_group(GroupId=groupId)
+        res.pop('ResponseMetadata', None)
+        return res
+
+    def _getGroupVersion(self, group):
+        if 'LatestVersion' not in group:
+            return {}
+        return self._cached(group['LatestVersionArn'], lambda: self.gg.get_group_version(
+            GroupId=group['Id'], GroupVersionId=group['LatestVersion'])['Definition'])
+
+    def _getDefinitionVersion(self, arn):
+        parsed = parseVersionArn(arn)
+        if parsed is None:
+            raise ValueError('Unexpected definition version arn {0}'.format(arn))
+        kind = DEFINITION_KINDS[parsed[0]]
+        method = getattr(self.gg, 'get_{0}_definition_version'.format(kind.lower()))
+        params = {
+            kind + 'DefinitionId': parsed[1],
+            kind + 'DefinitionVersionId': parsed[2]
+        }
+        return self._cached(arn, lambda: method(**params)['Definition'])
+
+    def describe(self, groupIds):
+        """
+        Return, for each group id, the group, its latest version and the definitions it references
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            groups = list(pool.map(self._getGroup, groupIds))
+        return self._describeGroups(groups)
+
+    def describeAll(self):
+        return self._describeGroups(self.catalog.listAll('group'))
+
+    def _describeGroups(self, groups):
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            versions = list(pool.map(self._getGroupVersion, groups))
+            arns = sorted(set(arn for v in versions for arn in v.values()))
+            definitions = dict(zip(arns, pool.map(self._getDefinitionVersion, arns)))
+        return [
+            {
+                'Group': g,
+                'GroupVersion': v,
+                'Definitions': dict((k, definitions[arn]) for k, arn in v.items())
+            }
+            for g, v in zip(groups, versions)]
@@ -1,6 +1,7 @@
 from .entity import EntityDefinition
 from .thing import Thing
-from itertools import chain
+from .provisioning import BulkProvisioner, DEFAULT_PROVISIONING_WORKERS
+from .model import ThingSpec
 import json
 from .logging import logError, logInfo, logRecycle, logSuccess, logDebug
 
@@ -9,28 +10,60 @@ class DeviceDefinition(EntityDefinition):
     Create a new Device definition if it does not already exists.
     Compare LatestVersion with new model configuration to avoid creating identical versions
     """
-    def __init__(self, gg, config):
-        EntityDefinition.__init__(self, gg, config)
+    def __init__(self, gg, config, catalog=None, policies=None, workers=DEFAULT_PROVISIONING_WORKERS, state=None, clients=None, credentials=None, plan=None):
+        EntityDefinition.__init__(self, gg, config, catalog, state, plan)
+        self.policies = policies
+        self.clients = clients
+        self.credentials = credentials
+        self.workers = workers
         self.entityName = "device"
-        self.things = []
+        self.provisioned = {}
+        self.preProvisioned = False
 
     def getPostfix(self):
         return "_device_defintion"
 
+    def _registry(self):
+        return self.plan.registry('things') if self.plan is not None else None
+
+    def restore(self, deployed):
+        registry = self._registry()
+        if registry is None:
+            return False
+        provisioned = {}
+        for k, v in self.config.iterThings():
+            cached = registry.get(ThingSpec.fromConfig(k, v))
+            if cached is None:
+                return False
+            provisioned[k] = cached
+        self.provisioned = provisioned
+        return True
+
+    def _provisioner(self, thing):
+        return BulkProvisioner(thing, self.workers, self.config.Group.get('bulkRegistration'), self._registry())
+
+    async def provisionAsync(self, call):
+        """
+        Provision the things from an event loop before create, see BulkProvisioner.provisionAsync
+        """
+        thing = Thing(self.config, self.policies, self.clients, self.credentials)
+        self.provisioned = await self._provisioner(thing).provisionAsync(self.config.iterThings(), call)
+        self.preProvisioned = True
+
     def getModelDefinition(self):
-        thing = Thing(self.config)
-        self.things = [dict(
-                    chain(
-                        thing.createThing(v['name'], v['policy']).items(), 
-                        v.items(), 
-                        {'id': k}.items()
-                    )
-                ) for k,v in self.config.Things.items()]
-
-        return thing.getThingDefinition(self.things)
-
-    def getExistingDefinitions(self):
-        return self.gg.list_device_definitions()['Definitions']
+        thing = Thing(self.config, self.policies, self.clients, self.credentials)
+        provisioned = self.provisioned if self.preProvisioned else self._provisioner(thing).provision(self.config.iterThings())
+        missing = [k for k, v in self.config.iterThings() if k not in provisioned]
+        if missing:
+            raise NameError('{0} things could not be provisioned: {1}'.format(len(missing), ', '.join(missing)))
+        self.provisioned = provisioned
+        return thing.getThingDefinition(self.iterThings())
+
+    def iterThings(self):
+        """
+        Iterate over the provisioned things, model.ProvisionedThing in configuration order
+        """
+        return iter(self.provisioned.values())
 
     def createEntityDefinition(self, name):
         return self.gg.create_device_definition(Name=name)
@@ -1,18 +1,20 @@
 from .logging import logError, logInfo, logRecycle, logSuccess
 from .utils import dicSlice, hashDict, compareDict 
+from .catalog import DefinitionCatalog
+from .hashing import definitionFingerprint
 
 class EntityDefinition: 
-    def __init__(self, gg, config):
+    def __init__(self, gg, config, catalog=None, state=None, plan=None):
         self.gg = gg
         self.entityName = "entity"
         self.config = config
+        self.catalog = catalog if catalog is not None else DefinitionCatalog(gg)
+        self.state = state
+        self.plan = plan
 
     def getPostfix(self):
         raise NotImplementedError( "Should have implemented this" )
 
-    def getExistingDefinitions(self):
-        raise NotImplementedError( "Should have implemented this" )
-
     def getEntityVersion(self, defId, verId):
         raise NotImplementedError( "Should have implemented this" )
 
@@ -25,11 +27,40 @@ class EntityDefinition:
     def createEntityDefinitionVersion(self, defId, model):
         raise NotImplementedError( "Should have implemented this" )
 
+    def restore(self, deployed):
+        """
+        Restore what getModelDefinition would have set when the definition is reused without
+        being built, return False if that is not possible
+        """
+        return True
+
     def create(self):
         version = []
         #print(self.entityName)
         name = self.config.Group['name']+self.getPostfix()
-        definitions = [dicSlice(x, ['Id', 'LatestVersion', 'LatestVersionArn']) for x in self.getExistingDefinitions() if 'Name' in x and x['Name']==name]
+        source = self.plan.sourceFingerprint(self.entityName) if self.plan is not None else None
+        if self.state is not None and source is not None:
+            deployed = self.state.getUnchanged(self.config, self.entityName, source)
+            if deployed is not None and self.restore(deployed):
+                logRecycle('{0} configuration has not changed since last deployment'.format(self.entityName))
+                self.arn = deployed['arn']
+                return True
+        try:
+            modelDefinition = self.getModelDefinition()
+        except NameError as e:
+            logError(str(e))
+            return False
+        modelFingerprint = definitionFingerprint(modelDefinition)
+        if self.state is not None:
+            deployed = self.state.get(self.config, self.entityName, modelFingerprint)
+            if deployed is not None:
+                logRecycle('{0} version has not changed since last deployment'.format(self.entityName))
+                self.arn = deployed['arn']
+                if deployed.get('source') != source:
+                    self.state.record(self.config, self.entityName, dict(deployed, source=source))
+                return True
+
+        definitions = self.catalog.find(self.entityName, name)
         if len(definitions)>1:
             logError('More than 1 {0} with name {1} exists'.format(self.entityName, name))
             return False
@@ -41,18 +72,17 @@ class EntityDefinition:
         else:
             res = self.createEntityDefinition(name)
             entityDefinitionId = res['Id']
+            self.catalog.record(self.entityName, name, res)
             logInfo('Created {0} definition {1}'.format(self.entityName, entityDefinitionId))
-        
-        try:
-            modelDefinition = self.getModelDefinition()
-        except NameError as e:
-            logError(e)
-            return False
+
         if len(version) and compareDict(version, modelDefinition):
             logRecycle('{0} version has not changed'.format(self.entityName))
             self.arn = definitions[0]['LatestVersionArn']
         else:
             res = self.createEntityDefinitionVersion(entityDefinitionId, modelDefinition)
             self.arn = res['Arn']
+            self.catalog.record(self.entityName, name, {'Id': entityDefinitionId, 'LatestVersion': res['Version'], 'LatestVersionArn': res['Arn']})
             logSuccess('Created {0} definition version {1}'.format(self.entityName, self.arn))
+        if self.state is not None:
+            self.state.record(self.config, self.entityName, {'id': entityDefinitionId, 'arn': self.arn, 'fingerprint': modelFingerprint, 'source': source})
         return True
\ No newline at end of file
@@ -0,0 +1,129 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+DEFAULT_WORKERS = 4
+
+
+class _TaskGraph:
+    def __init__(self):
+        self.tasks = {}
+        self.dependencies = {}
+
+    def add(self, name, task, dependsOn=()):
+        if name in self.tasks:
+            raise ValueError("Task {0} already defined".format(name))
+        self.tasks[name] = task
+        self.dependencies[name] = set(dependsOn)
+
+    def _checkGraph(self):
+        for name, deps in self.dependencies.items():
+            missing = deps - set(self.tasks)
+            if missing:
+                raise ValueError("Task {0} depends on undefined tasks {1}".format(name, sorted(missing)))
+        pending = dict((k, set(v)) for k, v in self.dependencies.items())
+        while pending:
+            ready = [k for k, v in pending.items() if not v]
+            if not ready:
+                raise ValueError("Circular dependency between tasks {0}".format(sorted(pending)))
+            for k in ready:
+                pending.pop(k)
+            for v in pending.values():
+                v.difference_update(ready)
+
+    def _ready(self, done, started):
+        return [name for name, deps in self.dependencies.items() if name not in done and name not in started and deps <= done]
+
+
+class DependencyExecutor(_TaskGraph):
+    """
+    Run a set of named tasks on a thread pool, starting each task as soon as all the tasks
+    it depends on have completed successfully.
+
+    A task is a callable returning True on success. As soon as a task returns something falsy
+    or raises, no further task is started. run() waits for the tasks already running, then
+    re-raises the first exception or returns False.
+    """
+    def __init__(self, workers=DEFAULT_WORKERS):
+        if workers < 1:
+            raise ValueError("At least 1 worker is required")
+        _TaskGraph.__init__(self)
+        self.workers = workers
+
+    def run(self):
+        self._checkGraph()
+        done = set()
+        running = {}
+        failed = False
+        error = None
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while True:
+                if not failed:
+                    for name in self._ready(done, set(running.values())):
+                        running[pool.submit(self.tasks[name])] = name
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for f in finished:
+                    name = running.pop(f)
+                    try:
+                        ok = f.result()
+                    except Exception as e:
+                        error = error or e
+                        ok = False
+                    if ok:
+                        done.add(name)
+                    else:
+                        failed = True
+        if error is not None:
+            raise error
+        return not failed and len(done) == len(self.tasks)
+
+
+class AsyncDependencyExecutor(_TaskGraph):
+    """
+    DependencyExecutor for asyncio: the same tasks, with the same failure rules, awaited from an
+    event loop. The blocking tasks run on executor (the loop default executor when None) and at
+    most as many run at once as the semaphore allows. Coroutine functions are awaited on the loop
+    and make their own blocking calls through call. A semaphore and an executor shared by many
+    AsyncDependencyExecutor bound the calls in flight and the threads of a whole process.
+    """
+    def __init__(self, semaphore=None, executor=None):
+        _TaskGraph.__init__(self)
+        self.semaphore = semaphore if semaphore is not None else asyncio.Semaphore(DEFAULT_WORKERS)
+        self.executor = executor
+
+    async def call(self, task, *args):
+        """
+        Run a blocking callable without blocking the event loop
+        """
+        async with self.semaphore:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, task, *args)
+
+    async def run(self):
+        self._checkGraph()
+        done = set()
+        running = {}
+        failed = False
+        error = None
+        while True:
+            if not failed:
+                for name in self._ready(done, set(running.values())):
+                    task = self.tasks[name]
+                    running[asyncio.ensure_future(task() if asyncio.iscoroutinefunction(task) else self.call(task))] = name
+            if not running:
+                break
+            finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for f in finished:
+                name = running.pop(f)
+                try:
+                    ok = f.result()
+                except Exception as e:
+                    error = error or e
+                    ok = False
+                if ok:
+                    done.add(name)
+                else:
+                    failed = True
+        if error is not None:
+            raise error
+        return not failed and len(done) == len(self.tasks)
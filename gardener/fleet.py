@@ -0,0 +1,106 @@
+import os
+import glob
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .config import Config
+from .sharding import ShardedGardener
+from .catalog import DefinitionCatalog
+from .policy import PolicyRegistry
+from .clients import ClientRegistry
+from .executor import DEFAULT_WORKERS
+from .provisioning import DEFAULT_PROVISIONING_WORKERS
+from .logging import logError
+
+CREATED = 'created'
+UNCHANGED = 'unchanged'
+FAILED = 'failed'
+
+
+def expandConfigPaths(paths):
+    """
+    Expand directories (every *.json file inside) and glob patterns into a sorted list of config files
+    """
+    files = set()
+    for p in paths:
+        if os.path.isdir(p):
+            files.update(glob.glob(os.path.join(p, '*.json')))
+        else:
+            matches = glob.glob(p)
+            if not matches:
+                raise ValueError('No config file matches {0}'.format(p))
+            files.update(matches)
+    return sorted(files)
+
+
+class FleetResult:
+    def __init__(self, file, group=None):
+        self.file = file
+        self.group = group
+        self.status = FAILED
+        self.duration = 0.0
+        self.error = None
+        self.configFiles = {}
+
+    def toDict(self):
+        return {
+            'file': self.file,
+            'group': self.group,
+            'status': self.status,
+            'duration': round(self.duration, 3),
+            'error': self.error,
+            'groups': list(self.configFiles)
+        }
+
+
+class Fleet:
+    """
+    Deploy many Greengrass groups, one per config file, on a bounded thread pool. A config with
+    too many things is deployed as several groups, see sharding.ShardedGardener.
+
+    Clients, definition catalogs and policy registries are shared by all the groups of the same region.
+    A failing group is reported in its result and does not stop the other deployments. The
+    credentials of each group are written to credentialsDir, in one archive per group when
+    credentialsFormat is 'tar' or 'zip'.
+    """
+    def __init__(self, files, workers=DEFAULT_WORKERS, definitionWorkers=DEFAULT_WORKERS, provisioningWorkers=DEFAULT_PROVISIONING_WORKERS, state=None, clients=None,
+            credentialsDir='.', credentialsFormat=None):
+        self.files = files
+        self.clients = clients if clients is not None else ClientRegistry()
+        self.state = state
+        self.workers = workers
+        self.definitionWorkers = definitionWorkers
+        self.provisioningWorkers = provisioningWorkers
+        self.credentialsDir = credentialsDir
+        self.credentialsFormat = credentialsFormat
+        self._regions = {}
+        self._lock = threading.Lock()
+
+    def _regionCaches(self, region):
+        with self._lock:
+            if region not in self._regions:
+                gg = self.clients.client('greengrass', region)
+                self._regions[region] = (DefinitionCatalog(gg), PolicyRegistry(self.clients.client('iot', region)))
+            return self._regions[region]
+
+    def _deploy(self, file):
+        result = FleetResult(file)
+        start = time.time()
+        try:
+            config = Config(file)
+            result.group = config.Group['name']
+            catalog, policies = self._regionCaches(config.Region)
+            # Shards of a group are deployed one after the other, the pool already runs groups concurrently
+            gardener = ShardedGardener(config, self.definitionWorkers, self.clients, catalog, policies, self.provisioningWorkers, self.state,
+                self.credentialsDir, self.credentialsFormat, shardWorkers=1)
+            result.configFiles = gardener.createGreengrass()
+            result.status = CREATED if gardener.changed else UNCHANGED
+        except Exception as e:
+            result.error = str(e)
+            logError('Group from {0} failed: {1}'.format(file, e))
+        result.duration = time.time() - start
+        return result
+
+    def deploy(self):
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(self._deploy, self.files))
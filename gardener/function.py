@@ -1,30 +1,22 @@
 from .entity import EntityDefinition
-import uuid
 import json
+from .hashing import assignIds
+from .model import LambdaSpec
 from .logging import logError, logInfo, logRecycle, logSuccess, logDebug
 
 
 class FunctionDefinition(EntityDefinition):
 
-    def __init__(self, gg,config):
-        EntityDefinition.__init__(self, gg, config)
+    def __init__(self, gg, config, catalog=None, state=None, plan=None):
+        EntityDefinition.__init__(self, gg, config, catalog, state, plan)
         self.entityName = "function"
 
     def getPostfix(self):
         return "_function_definition"
 
     def getModelDefinition(self):
-        return [
-            {
-                "FunctionArn": v['arn'],
-                "Id":str(uuid.uuid4()),
-                "FunctionConfiguration": v['FunctionConfiguration']
-            }
-            for v in self.config.Lambdas.values()]
+        return assignIds([LambdaSpec.fromConfig(k, v).toFunction() for k, v in self.config.Lambdas.items()])
     
-    def getExistingDefinitions(self):
-        return self.gg.list_function_definitions()['Definitions']
-
     def createEntityDefinition(self, name):
         return self.gg.create_function_definition(Name=name)
 
@@ -1,6 +1,5 @@
 import json
-import boto3
-
+import time
 import uuid
 import re
 from .utils import jsonPP, dicSlice
@@ -12,28 +11,78 @@ from .device import DeviceDefinition
 from .logger import LoggerDefinition
 from .subscription import SubscriptionDefinition
 from .group import GroupDefinition
+from .executor import DependencyExecutor, AsyncDependencyExecutor, DEFAULT_WORKERS
+from .catalog import DefinitionCatalog
+from .policy import PolicyRegistry
+from .provisioning import DEFAULT_PROVISIONING_WORKERS
+from .clients import defaultRegistry
+from .credentials import openCredentialStore
+from .plan import RebuildPlan
+
+def _created():
+    return True
+
 
 class Gardener:
-    def __init__(self, config):
+    def __init__(self, config, workers=DEFAULT_WORKERS, clients=None, catalog=None, policies=None, provisioningWorkers=DEFAULT_PROVISIONING_WORKERS, state=None, credentials=None, shared=None):
         self.config = config
-        self.gg = boto3.client('greengrass', region_name=self.config.Region)
-    
+        self.shared = shared if shared is not None else {}
+        self.state = state
+        self.credentials = credentials
+        self.workers = workers
+        self.provisioningWorkers = provisioningWorkers
+        self.clients = clients if clients is not None else defaultRegistry()
+        self.gg = self.clients.client('greengrass', self.config.Region)
+        self.catalog = catalog if catalog is not None else DefinitionCatalog(self.gg)
+        self.policies = policies if policies is not None else PolicyRegistry(self.clients.client('iot', self.config.Region))
+        self.metrics = self.clients.metrics
+
+    def _timed(self, phase, task):
+        if self.metrics is None:
+            return task
+
+        def run():
+            with self.metrics.phase(self.config.Group['name'], phase):
+                return task()
+        return run
+
     def _createDeployment(self):
         res = self.gg.create_deployment(DeploymentType='NewDeployment', GroupId=self.group.groupId, GroupVersionId=self.group.groupVersion)
         res.pop('ResponseMetadata')
         logSuccess('Created deployment {0}'.format(res))
         return True
 
-    def createGreengrass(self):
-        self.core = CoreDefinition(self.gg, self.config)
-        self.devices = DeviceDefinition(self.gg, self.config)
-        self.functions = FunctionDefinition(self.gg, self.config)
-        self.subscriptions = SubscriptionDefinition(self.gg, self.config, self.devices)
-        self.loggers = LoggerDefinition(self.gg, self.config)
-        self.group = GroupDefinition(self.gg, self.config, self.core, self.devices, self.functions, self.loggers, self.subscriptions)
-
-        if self.core.create() and self.devices.create() and self.functions.create() and self.loggers.create() and self.subscriptions.create() and self.group.create():
-            configFileContent = '''
+    def _addTasks(self, executor, credentials):
+        """
+        Create the definitions of the group and add the task creating each of them to executor
+        """
+        self.plan = RebuildPlan(self.config, self.state)
+        if self.state is not None:
+            logInfo('Rebuilding {0}, provisioning {1} of {2} things'.format(', '.join(e for e in self.plan.dirty if e not in self.shared) or 'nothing',
+                len(self.plan.dirtyThings) + len(self.plan.dirtyCores), len(self.plan.fingerprints['things']) + len(self.config.Cores)))
+        self.core = CoreDefinition(self.gg, self.config, self.catalog, self.policies, state=self.state, clients=self.clients, credentials=credentials, plan=self.plan)
+        self.devices = DeviceDefinition(self.gg, self.config, self.catalog, self.policies, self.provisioningWorkers, state=self.state, clients=self.clients, credentials=credentials, plan=self.plan)
+        # Definitions shared with other groups are already created
+        self.functions = self.shared.get('function') or FunctionDefinition(self.gg, self.config, self.catalog, state=self.state, plan=self.plan)
+        self.subscriptions = SubscriptionDefinition(self.gg, self.config, self.devices, self.catalog, state=self.state, plan=self.plan)
+        self.loggers = self.shared.get('logger') or LoggerDefinition(self.gg, self.config, self.catalog, state=self.state, plan=self.plan)
+        self.group = GroupDefinition(self.gg, self.config, self.core, self.devices, self.functions, self.loggers, self.subscriptions, self.catalog, state=self.state)
+
+        executor.add('core', self._timed('core', self.core.create))
+        executor.add('devices', self._timed('devices', self.devices.create), dependsOn=self._addProvisioning(executor))
+        executor.add('functions', self._timed('functions', self.functions.create) if 'function' not in self.shared else _created)
+        executor.add('loggers', self._timed('loggers', self.loggers.create) if 'logger' not in self.shared else _created)
+        executor.add('subscriptions', self._timed('subscriptions', self.subscriptions.create), dependsOn=['devices'])
+        executor.add('group', self._timed('group', self.group.create), dependsOn=['core', 'devices', 'functions', 'loggers', 'subscriptions'])
+
+    def _addProvisioning(self, executor):
+        """
+        Add the tasks provisioning the things ahead of the device definition, return their names
+        """
+        return []
+
+    def _configFile(self):
+        return '''
 {
     "coreThing": {
         "caPath": "root.ca.pem",
@@ -50,10 +99,74 @@ class Gardener:
     },
     "managedRespawn": false
 }
-            ''' % (self.core.thingName+CERT_POSTFIX, self.core.thingName+KEY_POSTFIX, self.core.coreThing['thingArn'], 'xxxx',self.config.Region, self.config.Region )
-            if self.config.Group['deploy']:
-                if not self._createDeployment():
-                    raise RuntimeError("Deployment could not be created")
-            return configFileContent
-        else:
-            raise RuntimeError("Something went wrong while creating the Greengrass configuration")
\ No newline at end of file
+            ''' % (self.core.thingName+CERT_POSTFIX, self.core.thingName+KEY_POSTFIX, self.core.coreThing.thingArn, 'xxxx',self.config.Region, self.config.Region )
+
+    def _finish(self):
+        """
+        Deploy the group version when configured and save the state
+        """
+        if self.config.Group['deploy']:
+            if not self._timed('deployment', self._createDeployment)():
+                raise RuntimeError("Deployment could not be created")
+        if self.state is not None:
+            self.state.save()
+        return self._configFile()
+
+    def createGreengrass(self):
+        # The store is closed once the definitions are created, all the keys are then on disk
+        credentials = self.credentials if self.credentials is not None else openCredentialStore()
+        executor = DependencyExecutor(self.workers)
+        try:
+            self._addTasks(executor, credentials)
+            created = executor.run()
+        finally:
+            credentials.close()
+        if not created:
+            raise RuntimeError("Something went wrong while creating the Greengrass configuration")
+        return self._finish()
+
+
+class AsyncGardener(Gardener):
+    """
+    Gardener for asyncio applications: createGreengrass is a coroutine driving the same definitions
+    from the event loop.
+
+    boto3 clients are blocking, every call into them (definitions, provisioning, deployment, state)
+    runs on executor, the loop default executor when None, and at most as many calls are made at
+    once as semaphore allows. The things are provisioned one call per thing through the same
+    semaphore and executor, ahead of the device definition, instead of by a pool of their own.
+    Many AsyncGardener sharing one semaphore and one executor, and the catalog and policies of
+    their region as in Fleet, deploy many groups concurrently with a bounded number of threads.
+    """
+    def __init__(self, config, semaphore=None, executor=None, clients=None, catalog=None, policies=None, provisioningWorkers=DEFAULT_PROVISIONING_WORKERS, state=None, credentials=None, shared=None):
+        Gardener.__init__(self, config, DEFAULT_WORKERS, clients, catalog, policies, provisioningWorkers, state, credentials, shared)
+        self.semaphore = semaphore
+        self.executor = executor
+
+    def _addProvisioning(self, executor):
+        if 'device' not in self.plan.dirty:
+            return []
+
+        async def provision():
+            start = time.monotonic()
+            try:
+                await self.devices.provisionAsync(executor.call)
+            finally:
+                if self.metrics is not None:
+                    self.metrics.recordPhase(self.config.Group['name'], 'provisioning', time.monotonic() - start)
+            return True
+        executor.add('provisioning', provision)
+        return ['provisioning']
+
+    async def createGreengrass(self):
+        credentials = self.credentials if self.credentials is not None else openCredentialStore()
+        executor = AsyncDependencyExecutor(self.semaphore, self.executor)
+        try:
+            # Building the rebuild plan reads every thing of the config
+            await executor.call(self._addTasks, executor, credentials)
+            created = await executor.run()
+        finally:
+            await executor.call(credentials.close)
+        if not created:
+            raise RuntimeError("Something went wrong while creating the Greengrass configuration")
+        return await executor.call(self._finish)
@@ -1,20 +1,44 @@
 
 from .logging import logError, logInfo, logRecycle, logSuccess, logDebug
 from .utils import dicSlice
+from .catalog import DefinitionCatalog
+from .hashing import definitionFingerprint
 
 class GroupDefinition:
-    def __init__(self, gg, config, core, devices, functions, loggers, subscriptions):
+    def __init__(self, gg, config, core, devices, functions, loggers, subscriptions, catalog=None, state=None):
         self.gg = gg
         self.config = config
+        self.catalog = catalog if catalog is not None else DefinitionCatalog(gg)
+        self.state = state
         self.core = core
         self.devices = devices
         self.functions = functions
         self.loggers = loggers
         self.subscriptions = subscriptions
+        self.changed = False
     
+    def getModelDefinition(self):
+        return {
+            'CoreDefinitionVersionArn': self.core.arn,
+            'DeviceDefinitionVersionArn': self.devices.arn,
+            'FunctionDefinitionVersionArn': self.functions.arn,
+            'LoggerDefinitionVersionArn': self.loggers.arn,
+            'SubscriptionDefinitionVersionArn': self.subscriptions.arn,
+            'RoleArn': self.config.Group['roleArn']
+        }
+
     def create(self):
         gv = []
-        groups = [dicSlice(x,['Id', 'LatestVersion']) for x in self.gg.list_groups()['Groups'] if 'Name' in x and x['Name']==self.config.Group['name']]
+        modelFingerprint = definitionFingerprint([self.getModelDefinition()])
+        if self.state is not None:
+            deployed = self.state.get(self.config, 'group', modelFingerprint)
+            if deployed is not None:
+                self.groupId = deployed['id']
+                self.groupVersion = deployed['version']
+                logRecycle('Group Version has not changed since last deployment')
+                return True
+
+        groups = self.catalog.find('group', self.config.Group['name'])
         if len(groups)>1:
             logError('More than 1 group with same name {0} already exists. Rename or delete other groups to continue.'.format(self.config.Group['name']))
             return False
@@ -22,37 +46,83 @@ class GroupDefinition:
             self.groupId = groups[0]['Id']
             # logRecycle ('Group {0} already exists with id {1}. Updating it'.format(self.config.Group['name'], self.groupId))
             if 'LatestVersion' in groups[0]:
-                gv = self.gg.get_group_version(GroupId=self.groupId, GroupVersionId=groups[0]['LatestVersion'])
+                gv = self._getGroupVersion(groups[0]['LatestVersion'])
         else:
             res = self.gg.create_group(Name=self.config.Group['name'])
             self.groupId = res['Id']
+            self.catalog.record('group', self.config.Group['name'], res)
             logSuccess('Created group {0} with id {1}'.format(self.config.Group['name'], self.groupId))
-        
-        try:
-            res = self.gg.list_group_certificate_authorities(GroupId=self.groupId)
-            if len(res['GroupCertificateAuthorities'])==0:
-                logInfo('Create Group Certificate Authority')
-                res = self.gg.create_group_certificate_authority(GroupId=self.groupId)
-            else:
-                logInfo('Group Certificate Authority already exists.')
-        except Exception as e:
-            logInfo(str(type(e))+str(e))
-            logInfo('Create Group Certificate Authority')
-            res = self.gg.create_group_certificate_authority(GroupId=self.groupId)
-        
-        res = self.gg.associate_role_to_group(GroupId=self.groupId, RoleArn=self.config.Group['roleArn'])
-        logInfo('Role {0} associated to group'.format(self.config.Group['roleArn']))
-        
-        if len(gv)>0 and self.compareGroupVersion(gv['Definition']):
+
+        self._reconcileMetadata(created=len(groups) == 0)
+
+        if len(gv)>0 and self.compareGroupVersion(gv):
             self.groupVersion = groups[0]['LatestVersion']
             logRecycle('Group Version has not changed')
         else:
             res = self.gg.create_group_version(GroupId=self.groupId, CoreDefinitionVersionArn=self.core.arn, DeviceDefinitionVersionArn=self.devices.arn, 
             FunctionDefinitionVersionArn=self.functions.arn, LoggerDefinitionVersionArn=self.loggers.arn, SubscriptionDefinitionVersionArn=self.subscriptions.arn)
             self.groupVersion = res['Version']
+            self.changed = True
+            self.catalog.record('group', self.config.Group['name'], {'Id': self.groupId, 'LatestVersion': res['Version'], 'LatestVersionArn': res['Arn']})
+            self._recordGroupVersion(res['Version'], self.getModelDefinition())
             logSuccess('Created group version {0} {1}'.format(res['Arn'], res['Version']))       
+        if self.state is not None:
+            self.state.record(self.config, 'group', {'id': self.groupId, 'version': self.groupVersion, 'fingerprint': modelFingerprint})
         return True
 
+    def _getGroupVersion(self, versionId):
+        """
+        Definition of a group version, from the state when it was created or read by a previous run
+        """
+        if self.state is not None:
+            cached = self.state.getWhere(self.config, 'groupVersion', 'versionId', versionId)
+            if cached is not None:
+                return cached['definition']
+        definition = self.gg.get_group_version(GroupId=self.groupId, GroupVersionId=versionId)['Definition']
+        self._recordGroupVersion(versionId, definition)
+        return definition
+
+    def _recordGroupVersion(self, versionId, definition):
+        if self.state is not None:
+            self.state.record(self.config, 'groupVersion', {'versionId': versionId, 'definition': definition})
+
+    def _associatedRole(self):
+        # botocore is always loaded once a client exists
+        from botocore.exceptions import ClientError
+        try:
+            return self.gg.get_associated_role(GroupId=self.groupId)['RoleArn']
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NotFoundException', 'ResourceNotFoundException'):
+                return None
+            raise
+
+    def _reconcileMetadata(self, created=False):
+        """
+        Make sure the group has a certificate authority and the configured role. What was verified by
+        a previous run is taken from the state, otherwise it is read, and only differences are written.
+        A group that was just created has neither.
+        """
+        roleArn = self.config.Group['roleArn']
+        metadata = self.state.getWhere(self.config, 'groupMetadata', 'groupId', self.groupId) if self.state is not None else None
+        if metadata is None:
+            metadata = {'groupId': self.groupId}
+        if not metadata.get('certificateAuthority'):
+            if not created:
+                res = self.gg.list_group_certificate_authorities(GroupId=self.groupId)
+            if created or len(res['GroupCertificateAuthorities'])==0:
+                logInfo('Create Group Certificate Authority')
+                self.gg.create_group_certificate_authority(GroupId=self.groupId)
+            else:
+                logInfo('Group Certificate Authority already exists.')
+            metadata['certificateAuthority'] = True
+        if metadata.get('roleArn') != roleArn:
+            if created or self._associatedRole() != roleArn:
+                self.gg.associate_role_to_group(GroupId=self.groupId, RoleArn=roleArn)
+                logInfo('Role {0} associated to group'.format(roleArn))
+            metadata['roleArn'] = roleArn
+        if self.state is not None:
+            self.state.record(self.config, 'groupMetadata', metadata)
+
     def compareGroupVersion(self, gdv):
         # logRecycle("""--core-definition-version-arn {0}
         # --device-definition-version-arn {1}
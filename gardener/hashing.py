@@ -0,0 +1,64 @@
+import json
+import uuid
+import hashlib
+from collections import Counter
+
+# Namespace of the uuid5 Ids generated by gardener, never change it or every definition will look changed
+ID_NAMESPACE = uuid.UUID('6f0c1c4e-2f53-5a8e-9d5c-3b7e1e0a9b41')
+
+
+def canonicalJson(obj):
+    """
+    Serialize obj to JSON with sorted keys at every level and no insignificant whitespace
+    """
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+def digest(obj):
+    return hashlib.sha256(canonicalJson(obj).encode('utf-8')).hexdigest()
+
+
+def streamDigest(items):
+    """
+    Digest of a sequence of objects, read one at a time
+    """
+    h = hashlib.sha256()
+    for x in items:
+        h.update(canonicalJson(x).encode('utf-8'))
+        h.update(b'\n')
+    return h.hexdigest()
+
+
+def entityDigest(d, ignore=('Id',)):
+    """
+    Digest of a definition entity (a device, function, subscription...) ignoring specific keys
+    """
+    return digest(dict((k, v) for k, v in d.items() if k not in ignore))
+
+
+def definitionDigests(model, ignore=('Id',)):
+    """
+    Multiset of the digests of the entities of a definition model
+    """
+    return Counter(entityDigest(x, ignore) for x in model)
+
+
+def definitionFingerprint(model, ignore=('Id',)):
+    """
+    Digest of a whole definition model, independent of the entity order
+    """
+    return digest(sorted(definitionDigests(model, ignore).elements()))
+
+
+def assignIds(model):
+    """
+    Set a deterministic uuid5 Id on every entity of a model, derived from its content.
+    Identical entities get distinct Ids based on their occurrence.
+    """
+    seen = Counter()
+    for x in model:
+        d = entityDigest(x)
+        name = d if seen[d] == 0 else '{0}#{1}'.format(d, seen[d])
+        seen[d] += 1
+        x['Id'] = str(uuid.uuid5(ID_NAMESPACE, name))
+    return model
@@ -1,31 +1,27 @@
 from .entity import EntityDefinition
-import uuid
 import json
+from .hashing import assignIds
 from .logging import logError, logInfo, logRecycle, logSuccess, logDebug
 
 
 class LoggerDefinition(EntityDefinition):
 
-    def __init__(self, gg,config):
-        EntityDefinition.__init__(self, gg, config)
+    def __init__(self, gg, config, catalog=None, state=None, plan=None):
+        EntityDefinition.__init__(self, gg, config, catalog, state, plan)
         self.entityName = "logger"
 
     def getPostfix(self):
         return "_logger_definition"
 
     def getModelDefinition(self):
-        return [
+        return assignIds([
             {
                 "Component": l['Component'],
-                "Id": str(uuid.uuid4()),
                 "Level": l['Level'],
                 "Space": l['Space'],
                 "Type": l['Type']
             }
-            for l in self.config.Loggers]
-
-    def getExistingDefinitions(self):
-        return self.gg.list_logger_definitions()['Definitions']
+            for l in self.config.Loggers])
 
     def createEntityDefinition(self, name):
         return self.gg.create_logger_definition(Name=name)
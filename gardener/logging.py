@@ -1,11 +1,140 @@
+import re
+import sys
+import json
+import queue
+import atexit
+import logging
+import datetime
+import threading
+import logging.handlers
+from . import globals as settings
+
+LOGGER_NAME = 'gardener'
+
+
 class Icons:
     Sparkle = u"\u2728"
     Recycle = u"\U0001F4CC"
     Error = u"\u26D4"
     Check = u"\u2705"
 
-def log(msg, icon=""):
-    print(icon + "  " + msg)
+
+_privateKeyRegex = re.compile(r'-----BEGIN [A-Z ]*PRIVATE KEY-----.*?-----END [A-Z ]*PRIVATE KEY-----', re.S)
+
+
+class RedactingFilter(logging.Filter):
+    """
+    Replace private keys in messages, in case one ends up in a log line
+    """
+    def filter(self, record):
+        msg = record.getMessage()
+        if 'PRIVATE KEY-----' in msg:
+            record.msg = _privateKeyRegex.sub('<redacted private key>', msg)
+            record.args = None
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    """
+    The icon and message on terminals, the level and message otherwise
+    """
+    def __init__(self, icons):
+        logging.Formatter.__init__(self)
+        self.icons = icons
+
+    def format(self, record):
+        if self.icons:
+            return getattr(record, 'icon', '') + '  ' + record.getMessage()
+        return '{0} {1}'.format(record.levelname, record.getMessage())
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps({
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage()
+        })
+
+
+_lock = threading.Lock()
+_listener = None
+
+
+def configureLogging(level=None, format='text', stream=None):
+    """
+    Send the gardener log records through a queue to a background thread writing them to stream
+    (stderr by default, stdout is kept for the command results), as text or as JSON lines. The
+    level defaults to DEBUG when globals.DEBUG is set and INFO otherwise. Calling it again
+    replaces the previous configuration.
+    """
+    global _listener
+    if format not in ('text', 'json'):
+        raise ValueError('Unknown log format {0}'.format(format))
+    stream = stream if stream is not None else sys.stderr
+    if level is None:
+        level = logging.DEBUG if settings.DEBUG else logging.INFO
+    elif isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+
+    handler = logging.StreamHandler(stream)
+    if format == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(TextFormatter(hasattr(stream, 'isatty') and stream.isatty()))
+
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+        logger = logging.getLogger(LOGGER_NAME)
+        for h in list(logger.handlers):
+            logger.removeHandler(h)
+        records = queue.SimpleQueue()
+        queueHandler = logging.handlers.QueueHandler(records)
+        queueHandler.addFilter(RedactingFilter())
+        logger.addHandler(queueHandler)
+        logger.setLevel(level)
+        logger.propagate = False
+        _listener = logging.handlers.QueueListener(records, handler)
+        _listener.start()
+    return logger
+
+
+def flushLogs():
+    """
+    Write every queued record, the logs can be used again afterwards
+    """
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener.start()
+
+
+def _stop():
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+atexit.register(_stop)
+
+
+def _logger():
+    logger = logging.getLogger(LOGGER_NAME)
+    if not logger.handlers:
+        with _lock:
+            configured = _listener is not None
+        if not configured:
+            return configureLogging()
+    return logger
+
+
+def log(msg, icon="", level=logging.INFO):
+    _logger().log(level, msg, extra={'icon': icon})
 
 
 def logInfo(msg):
@@ -17,7 +146,7 @@ def logSuccess(msg):
 
 
 def logError(msg):
-    log(msg, Icons.Error)
+    log(msg, Icons.Error, logging.ERROR)
 
 
 def logCreate(msg):
@@ -29,5 +158,6 @@ def logRecycle(msg):
 
 
 def logDebug(msg):
-    # if DEBUG:
-    print(msg)
\ No newline at end of file
+    logger = _logger()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(msg if isinstance(msg, str) else repr(msg), extra={'icon': ''})
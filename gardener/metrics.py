@@ -0,0 +1,195 @@
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Event emitted by the rate limited clients when they retry a call, see throttle.RateLimitedClient
+RETRY_EVENT = 'gardener-retry'
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def cumulative(self):
+        """
+        Return the (upper bound, number of values lower or equal) pairs, the last bound being +Inf
+        """
+        total = 0
+        res = []
+        for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+            total += count
+            res.append((bound, total))
+        return res
+
+    def toDict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'max': round(self.max, 6),
+            'buckets': dict((str(b), c) for b, c in self.cumulative())
+        }
+
+
+class OperationStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.latency = Histogram()
+
+    def toDict(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'retries': self.retries,
+            'latency': self.latency.toDict()
+        }
+
+
+def _labels(**labels):
+    return '{' + ','.join('{0}="{1}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels.items()) + '}'
+
+
+class Metrics:
+    """
+    Per-operation API call metrics and deployment phase timings of a run.
+
+    instrument() hooks the botocore event system of a client: every call is counted with its
+    latency, error and retries (the attempts made by botocore and the retries of the rate limiter).
+    phase() times a step of a group deployment. limiters, a callable such as throttle.allStats,
+    adds the counters of the rate limiters by service/region to the report, which is available as
+    a dictionary or in the Prometheus text format.
+    """
+    def __init__(self, limiters=None):
+        self._lock = threading.Lock()
+        self.operations = {}
+        self.phases = {}
+        self.limiters = limiters
+
+    def _operation(self, service, operation):
+        key = (service, operation)
+        if key not in self.operations:
+            self.operations[key] = OperationStats()
+        return self.operations[key]
+
+    def instrument(self, client, service):
+        """
+        Register the metrics handlers on the events of client, return False if it has no event system
+        """
+        events = getattr(getattr(client, 'meta', None), 'events', None)
+        if events is None:
+            return False
+
+        def beforeCall(context, **kwargs):
+            context['gardenerStart'] = time.monotonic()
+
+        def needsRetry(attempts, request_dict, **kwargs):
+            request_dict.get('context', {})['gardenerAttempts'] = attempts
+
+        def afterCall(http_response, model, context, **kwargs):
+            self._observe(service, model.name, context, http_response.status_code >= 400)
+
+        # botocore emits after-call-error with the exception and the context only
+        def afterCallError(event_name, context, **kwargs):
+            self._observe(service, event_name.split('.')[-1], context, True)
+
+        def retried(event_name, **kwargs):
+            with self._lock:
+                self._operation(service, event_name.split('.')[-1]).retries += 1
+
+        # Registered first so that they run even when another handler answers, such as a stubbed
+        # response or the retry handler of botocore
+        events.register_first('before-call', beforeCall)
+        events.register_first('needs-retry', needsRetry)
+        events.register('after-call', afterCall)
+        events.register('after-call-error', afterCallError)
+        events.register(RETRY_EVENT, retried)
+        return True
+
+    def _observe(self, service, operation, context, error):
+        now = time.monotonic()
+        latency = now - context.get('gardenerStart', now)
+        with self._lock:
+            stats = self._operation(service, operation)
+            stats.calls += 1
+            stats.errors += 1 if error else 0
+            stats.retries += max(0, context.get('gardenerAttempts', 1) - 1)
+            stats.latency.observe(latency)
+
+    def recordPhase(self, group, phase, duration):
+        with self._lock:
+            phases = self.phases.setdefault(group, {})
+            phases[phase] = phases.get(phase, 0.0) + duration
+
+    @contextmanager
+    def phase(self, group, phase):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.recordPhase(group, phase, time.monotonic() - start)
+
+    def _limiterStats(self):
+        return sorted(self.limiters().items()) if self.limiters is not None else []
+
+    def toDict(self):
+        limiters = self._limiterStats()
+        with self._lock:
+            return {
+                'operations': dict(('{0}.{1}'.format(s, o), v.toDict()) for (s, o), v in sorted(self.operations.items())),
+                'phases': dict((g, dict((p, round(d, 6)) for p, d in v.items())) for g, v in sorted(self.phases.items())),
+                'limiters': dict(limiters)
+            }
+
+    def toJson(self):
+        return json.dumps(self.toDict(), indent=2)
+
+    def toPrometheus(self):
+        with self._lock:
+            operations = sorted(self.operations.items())
+            phases = sorted((g, p, d) for g, v in self.phases.items() for p, d in v.items())
+        limiters = [(k.partition('/'), v) for k, v in self._limiterStats()]
+        lines = []
+        for name, help in [('calls', 'API calls'), ('errors', 'API calls that failed'), ('retries', 'API call retries')]:
+            lines.append('# HELP gardener_api_{0}_total {1}'.format(name, help))
+            lines.append('# TYPE gardener_api_{0}_total counter'.format(name))
+            for (s, o), v in operations:
+                lines.append('gardener_api_{0}_total{1} {2}'.format(name, _labels(service=s, operation=o), getattr(v, name)))
+        lines.append('# HELP gardener_api_latency_seconds API call latency')
+        lines.append('# TYPE gardener_api_latency_seconds histogram')
+        for (s, o), v in operations:
+            for bound, count in v.latency.cumulative():
+                lines.append('gardener_api_latency_seconds_bucket{0} {1}'.format(_labels(service=s, operation=o, le=bound), count))
+            lines.append('gardener_api_latency_seconds_sum{0} {1}'.format(_labels(service=s, operation=o), v.latency.sum))
+            lines.append('gardener_api_latency_seconds_count{0} {1}'.format(_labels(service=s, operation=o), v.latency.count))
+        lines.append('# HELP gardener_phase_seconds Time spent in each deployment phase')
+        lines.append('# TYPE gardener_phase_seconds gauge')
+        for g, p, d in phases:
+            lines.append('gardener_phase_seconds{0} {1}'.format(_labels(group=g, phase=p), d))
+        for name, key, help in [('calls_total', 'calls', 'Calls made through the rate limiter'),
+                ('retries_total', 'retries', 'Calls retried by the rate limiter'),
+                ('throttled_total', 'throttled', 'Calls throttled by the service'),
+                ('errors_total', 'errors', 'Calls failed after the last retry'),
+                ('wait_seconds_total', 'limiterWait', 'Time spent waiting for the rate limiter'),
+                ('backoff_seconds_total', 'backoffWait', 'Time spent backing off before retries')]:
+            lines.append('# HELP gardener_limiter_{0} {1}'.format(name, help))
+            lines.append('# TYPE gardener_limiter_{0} counter'.format(name))
+            for (s, _, r), v in limiters:
+                lines.append('gardener_limiter_{0}{1} {2}'.format(name, _labels(service=s, region=r), v[key]))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,88 @@
+import sys
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class ThingSpec:
+    """
+    A thing or core of the configuration, built from its Things or Cores entry
+    """
+    __slots__ = ('id', 'name', 'syncShadow', 'policy')
+
+    def __init__(self, id, name, syncShadow=False, policy=None):
+        self.id = id
+        self.name = name
+        self.syncShadow = syncShadow
+        self.policy = _intern(policy)
+
+    @classmethod
+    def fromConfig(cls, id, spec):
+        return cls(id, spec['name'], spec.get('syncShadow', False), spec.get('policy'))
+
+
+class ProvisionedThing:
+    """
+    A thing once provisioned, with its thing and certificate arns
+    """
+    __slots__ = ('id', 'name', 'syncShadow', 'thingArn', 'certArn')
+
+    def __init__(self, spec, thingArn, certArn):
+        self.id = spec.id
+        self.name = spec.name
+        self.syncShadow = spec.syncShadow
+        self.thingArn = _intern(thingArn)
+        self.certArn = _intern(certArn)
+
+    def toDevice(self):
+        return {
+            "ThingArn": self.thingArn,
+            "SyncShadow": self.syncShadow,
+            "CertificateArn": self.certArn
+        }
+
+
+class LambdaSpec:
+    """
+    A lambda of the configuration, built from its Lambdas entry
+    """
+    __slots__ = ('id', 'arn', 'configuration')
+
+    def __init__(self, id, arn, configuration):
+        self.id = id
+        self.arn = _intern(arn)
+        self.configuration = configuration
+
+    @classmethod
+    def fromConfig(cls, id, spec):
+        return cls(id, spec['arn'], spec['FunctionConfiguration'])
+
+    def toFunction(self):
+        return {
+            "FunctionArn": self.arn,
+            "FunctionConfiguration": self.configuration
+        }
+
+
+class Route:
+    """
+    A compiled route, with its endpoints resolved to arns and topics, and its subscription Id
+    """
+    __slots__ = ('id', 'source', 'subject', 'target')
+
+    def __init__(self, source, subject, target, id=None):
+        self.id = id
+        self.source = _intern(source)
+        self.subject = _intern(subject)
+        self.target = _intern(target)
+
+    def toSubscription(self):
+        subscription = {
+            "Source": self.source,
+            "Subject": self.subject,
+            "Target": self.target
+        }
+        if self.id is not None:
+            subscription['Id'] = self.id
+        return subscription
@@ -0,0 +1,109 @@
+from .hashing import digest, streamDigest
+from .model import ThingSpec, ProvisionedThing
+
+# Config sections each definition is built from
+ENTITY_SECTIONS = {
+    'core': ('Cores', 'Policies'),
+    'device': ('Things', 'Policies'),
+    'function': ('Lambdas',),
+    'logger': ('Loggers',),
+    'subscription': ('Routes', 'Things', 'Lambdas')
+}
+
+
+def thingFingerprint(config, spec):
+    """
+    Fingerprint of what provisioning a thing depends on: its name, its policy and the policy document
+    """
+    return digest({
+        'name': spec.name,
+        'policy': spec.policy,
+        'policyDocument': config.Policies.get(spec.policy)
+    })
+
+
+def sectionFingerprints(config):
+    """
+    Return the fingerprint of each config section, and of each entry of Things. Things and Routes
+    are streamed, their templates and shards are not loaded.
+    """
+    things = dict((k, digest(v)) for k, v in config.iterThings())
+    return {
+        'Cores': digest(config.Cores),
+        'Things': digest(things),
+        'Lambdas': digest(config.Lambdas),
+        'Loggers': digest(config.Loggers),
+        'Routes': streamDigest(config.iterRoutes()),
+        'Policies': digest(config.Policies),
+        'things': things
+    }
+
+
+class ThingRegistry:
+    """
+    Thing and certificate arns of the things of a config section (cores or things) provisioned by
+    previous runs, kept in the deployment state. An entry is reused as long as the name, policy and
+    policy document of the thing are unchanged.
+    """
+    def __init__(self, state, config, section='things'):
+        self.state = state
+        self.config = config
+        self.section = section
+
+    def get(self, spec):
+        """
+        Return the model.ProvisionedThing of the model.ThingSpec spec, None when it must be provisioned
+        """
+        entry = self.state.getThing(self.config, self.section, spec.id, thingFingerprint(self.config, spec))
+        if entry is None:
+            return None
+        return ProvisionedThing(spec, entry['thingArn'], entry['certArn'])
+
+    def record(self, spec, provisioned):
+        self.state.recordThing(self.config, self.section, spec.id,
+            {'thingArn': provisioned.thingArn, 'certArn': provisioned.certArn, 'fingerprint': thingFingerprint(self.config, spec)})
+
+
+class RebuildPlan:
+    """
+    Compare the config sections with the deployment state to find the definitions that must be
+    rebuilt and the cores and things that must be provisioned. Without state, everything is dirty.
+    """
+    def __init__(self, config, state=None):
+        self.config = config
+        self.state = state
+        # Nothing has been called yet, fail before anything is provisioned
+        config.checkRouteTemplates()
+        self.fingerprints = sectionFingerprints(config)
+        self.dirty = [e for e in sorted(ENTITY_SECTIONS) if self._isDirty(e)]
+        self.dirtyCores = self._dirtyThings('cores', config.Cores.items())
+        self.dirtyThings = self._dirtyThings('things', config.iterThings())
+
+    def sourceFingerprint(self, entity):
+        """
+        Fingerprint of the config sections entity is built from, None for the other entities
+        """
+        if entity not in ENTITY_SECTIONS:
+            return None
+        return digest(dict((s, self.fingerprints[s]) for s in ENTITY_SECTIONS[entity]))
+
+    def _isDirty(self, entity):
+        return self.state is None or self.state.getUnchanged(self.config, entity, self.sourceFingerprint(entity)) is None
+
+    def _dirtyThings(self, section, things):
+        if self.state is None:
+            return [k for k, v in things]
+        registry = ThingRegistry(self.state, self.config, section)
+        return [k for k, v in things if registry.get(ThingSpec.fromConfig(k, v)) is None]
+
+    def registry(self, section):
+        return ThingRegistry(self.state, self.config, section) if self.state is not None else None
+
+    def toDict(self):
+        return {
+            'group': self.config.Group['name'],
+            'dirty': self.dirty,
+            'dirtyCores': self.dirtyCores,
+            'dirtyThings': len(self.dirtyThings),
+            'things': len(self.fingerprints['things'])
+        }
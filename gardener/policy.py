@@ -0,0 +1,75 @@
+import json
+import threading
+from .utils import paginate
+from .hashing import digest
+from .logging import logInfo, logRecycle, logSuccess
+
+MAX_POLICY_VERSIONS = 5
+
+
+class PolicyRegistry:
+    """
+    Resolve the IoT policies used by the things of a run.
+
+    The existing policies are listed once, through all the pages, and each distinct policy is
+    created or updated at most once. When the document of an existing policy differs from the
+    configuration, a new default policy version is created. A registry shared by many groups
+    refuses a policy name that comes with a different document than the one already resolved.
+    """
+    def __init__(self, iot):
+        self.iot = iot
+        self._lock = threading.Lock()
+        self._policyLocks = {}
+        self._existing = None
+        # (name, document digest) -> arn, and name -> digest of the document resolved in this run
+        self._resolved = {}
+        self._documents = {}
+
+    def _existingPolicies(self):
+        with self._lock:
+            if self._existing is None:
+                policies = paginate(self.iot.list_policies, 'policies', tokenIn='marker', tokenOut='nextMarker')
+                self._existing = dict([(x['policyName'], x['policyArn']) for x in policies])
+            return self._existing
+
+    def ensure(self, policyName, policyDoc):
+        """
+        Make sure policyName exists with policyDoc as default version and return its arn
+        """
+        with self._lock:
+            policyLock = self._policyLocks.setdefault(policyName, threading.Lock())
+        key = (policyName, digest(policyDoc))
+        with policyLock:
+            if self._documents.setdefault(policyName, key[1]) != key[1]:
+                raise ValueError('Policy {0} is configured with different documents in this run'.format(policyName))
+            if key not in self._resolved:
+                self._resolved[key] = self._createOrUpdate(policyName, policyDoc)
+            return self._resolved[key]
+
+    def _createOrUpdate(self, policyName, policyDoc):
+        existing = self._existingPolicies()
+        if policyName not in existing:
+            res = self.iot.create_policy(policyName=policyName, policyDocument=json.dumps(policyDoc))
+            logSuccess('Created policy {0}'.format(res['policyArn']))
+            return res['policyArn']
+
+        currentPolicyDoc = self.iot.get_policy(policyName=policyName)['policyDocument']
+        if policyDoc == json.loads(currentPolicyDoc):
+            logRecycle('Policy {0} already exists with arn {1}'.format(policyName, existing[policyName]))
+        else:
+            self._deleteOldestVersion(policyName)
+            res = self.iot.create_policy_version(policyName=policyName, policyDocument=json.dumps(policyDoc), setAsDefault=True)
+            logSuccess('Created version {0} of policy {1}'.format(res['policyVersionId'], policyName))
+        return existing[policyName]
+
+    def _deleteOldestVersion(self, policyName):
+        """
+        IoT keeps at most 5 versions of a policy, drop the oldest non default one to make room
+        """
+        versions = self.iot.list_policy_versions(policyName=policyName)['policyVersions']
+        if len(versions) < MAX_POLICY_VERSIONS:
+            return
+        candidates = [v for v in versions if not v['isDefaultVersion']]
+        oldest = min(candidates, key=lambda v: int(v['versionId']))
+        self.iot.delete_policy_version(policyName=policyName, policyVersionId=oldest['versionId'])
+        logInfo('Deleted version {0} of policy {1}'.format(oldest['versionId'], policyName))
@@ -0,0 +1,219 @@
+import json
+import time
+import asyncio
+import uuid
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from .utils import paginate
+from .logging import logError, logInfo, logRecycle, logSuccess
+from .model import ThingSpec, ProvisionedThing
+
+DEFAULT_PROVISIONING_WORKERS = 8
+
+REGISTRATION_TEMPLATE = {
+    "Parameters": {
+        "ThingName": {"Type": "String"},
+        "CSR": {"Type": "String"},
+        "PolicyName": {"Type": "String"}
+    },
+    "Resources": {
+        "thing": {
+            "Type": "AWS::IoT::Thing",
+            "Properties": {"ThingName": {"Ref": "ThingName"}}
+        },
+        "certificate": {
+            "Type": "AWS::IoT::Certificate",
+            "Properties": {"CertificateSigningRequest": {"Ref": "CSR"}, "Status": "ACTIVE"}
+        },
+        "policy": {
+            "Type": "AWS::IoT::Policy",
+            "Properties": {"PolicyName": {"Ref": "PolicyName"}}
+        }
+    }
+}
+
+
+class BulkProvisioner:
+    """
+    Provision many things concurrently, collecting the errors of each thing instead of stopping
+    at the first one.
+
+    Every thing runs the Thing.createThing pipeline on a pool of workers. When bulkRegistration
+    settings are given (bucket, roleArn and optionally prefix), the things that do not exist yet
+    are registered in a single IoT bulk registration task instead. With a registry (see
+    plan.ThingRegistry), the things provisioned by previous runs are not provisioned again.
+
+    provisionAsync does the same from an event loop, making every blocking call through the given
+    call coroutine (see executor.AsyncDependencyExecutor.call) instead of the pool of workers.
+    """
+    def __init__(self, thing, workers=DEFAULT_PROVISIONING_WORKERS, bulkRegistration=None, registry=None):
+        self.thing = thing
+        self.workers = workers
+        self.bulkRegistration = bulkRegistration
+        self.registry = registry
+        self.errors = {}
+
+    def _provisionOne(self, spec):
+        try:
+            res = self.thing.createThing(spec.name, spec.policy)
+        except Exception as e:
+            self.errors[spec.id] = str(e)
+            return None
+        if not res:
+            self.errors[spec.id] = 'Thing {0} could not be provisioned'.format(spec.name)
+            return None
+        return ProvisionedThing(spec, res['thingArn'], res['certArn'])
+
+    def provision(self, things):
+        """
+        Provision the things, an iterable of (id, spec) pairs, and return a dictionary id -> model.ProvisionedThing
+        for the things provisioned successfully, in the order of things. The failures are available in self.errors.
+        """
+        specs, cached, pending = self._prepare(things)
+        return self._finish(specs, cached, pending, self._provision(pending))
+
+    async def provisionAsync(self, things, call):
+        """
+        Coroutine provisioning the things like provision, every blocking call is awaited through call(function, *args)
+        """
+        specs, cached, pending = await call(self._prepare, things)
+        provisioned, remaining = await call(self._register, pending)
+        results = await asyncio.gather(*[call(self._provisionOne, t) for t in remaining])
+        provisioned.update((t.id, res) for t, res in zip(remaining, results) if res)
+        return await call(self._finish, specs, cached, pending, provisioned)
+
+    def _prepare(self, things):
+        """
+        Return the specs of things, the provisioned things found in the registry by id and the specs left to provision
+        """
+        specs = [ThingSpec.fromConfig(k, v) for k, v in things]
+        self.errors = {}
+        cached = {}
+        if self.registry is not None:
+            for spec in specs:
+                provisioned = self.registry.get(spec)
+                if provisioned is not None:
+                    cached[spec.id] = provisioned
+            if cached:
+                logRecycle('{0} things unchanged since last provisioning'.format(len(cached)))
+        return specs, cached, [spec for spec in specs if spec.id not in cached]
+
+    def _finish(self, specs, cached, pending, provisioned):
+        if self.registry is not None:
+            for spec in pending:
+                if spec.id in provisioned:
+                    self.registry.record(spec, provisioned[spec.id])
+        for k, e in self.errors.items():
+            logError('Thing {0}: {1}'.format(k, e))
+        results = {}
+        for spec in specs:
+            result = cached.get(spec.id) or provisioned.get(spec.id)
+            if result is not None:
+                results[spec.id] = result
+        return results
+
+    def _register(self, things):
+        """
+        Register things in bulk when configured, return the registered things by id and the things left to provision one by one
+        """
+        if not things or not self.bulkRegistration:
+            return {}, things
+        registration = BulkRegistration(self.thing, self.bulkRegistration)
+        registered = registration.register(things)
+        self.errors.update(registration.errors)
+        return dict(registered), [t for t in things if t.id not in registered and t.id not in registration.errors]
+
+    def _provision(self, things):
+        results, things = self._register(things)
+        if not things:
+            return results
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [(t.id, pool.submit(self._provisionOne, t)) for t in things]
+            for k, f in futures:
+                res = f.result()
+                if res:
+                    results[k] = res
+        return results
+
+
+class BulkRegistration:
+    """
+    Register new things with start_thing_registration_task.
+
+    Keys and CSRs are generated locally (this requires the cryptography package), the input file
+    is uploaded to S3 and the task results are read back to collect the thing and certificate arns.
+    Things that already exist are left to the regular provisioning pipeline.
+    """
+    POLL_INTERVAL = 5
+
+    def __init__(self, thing, settings):
+        self.thing = thing
+        self.iot = thing.iot
+        self.bucket = settings['bucket']
+        self.roleArn = settings['roleArn']
+        self.prefix = settings.get('prefix', 'gardener/')
+        self.errors = {}
+
+    def _generateKeyAndCsr(self, name):
+        try:
+            from cryptography import x509
+            from cryptography.hazmat.primitives import hashes, serialization
+            from cryptography.hazmat.primitives.asymmetric import rsa
+            from cryptography.x509.oid import NameOID
+        except ImportError:
+            raise RuntimeError('Bulk registration requires the cryptography package')
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        csr = x509.CertificateSigningRequestBuilder().subject_name(
+            x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, name)])).sign(key, hashes.SHA256())
+        keyPem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.NoEncryption()).decode()
+        return keyPem, csr.public_bytes(serialization.Encoding.PEM).decode()
+
+    def _readReport(self, taskId, reportType):
+        lines = []
+        for link in paginate(self.iot.list_thing_registration_task_reports, 'resourceLinks', tokenIn='nextToken', tokenOut='nextToken',
+                taskId=taskId, reportType=reportType):
+            with urllib.request.urlopen(link) as f:
+                lines.extend(json.loads(l) for l in f.read().decode().splitlines() if l.strip())
+        return lines
+
+    def register(self, things):
+        existing = set(x['thingName'] for x in paginate(self.iot.list_things, 'things', tokenIn='nextToken', tokenOut='nextToken'))
+        new = [t for t in things if t.name not in existing]
+        if not new:
+            return {}
+
+        keys = []
+        records = []
+        for t in new:
+            self.thing.policies.ensure(t.policy + '_Policy', self.thing.config.Policies[t.policy])
+            keyPem, csr = self._generateKeyAndCsr(t.name)
+            keys.append(keyPem)
+            records.append(json.dumps({'ThingName': t.name, 'CSR': csr, 'PolicyName': t.policy + '_Policy'}))
+
+        key = '{0}{1}.json'.format(self.prefix, uuid.uuid4())
+        s3 = self.thing.clients.client('s3', self.thing.config.Region)
+        s3.put_object(Bucket=self.bucket, Key=key, Body='\n'.join(records).encode())
+        taskId = self.iot.start_thing_registration_task(templateBody=json.dumps(REGISTRATION_TEMPLATE),
+            inputFileBucket=self.bucket, inputFileKey=key, roleArn=self.roleArn)['taskId']
+        logInfo('Started thing registration task {0} for {1} things'.format(taskId, len(new)))
+
+        while True:
+            task = self.iot.describe_thing_registration_task(taskId=taskId)
+            if task['status'] in ('Completed', 'Failed', 'Cancelled'):
+                break
+            time.sleep(self.POLL_INTERVAL)
+        if task['status'] != 'Completed':
+            raise RuntimeError('Thing registration task {0} {1}: {2}'.format(taskId, task['status'], task.get('message', '')))
+
+        results = {}
+        for r in self._readReport(taskId, 'RESULTS'):
+            t = new[r['offset']]
+            arns = r['response']['ResourceArns']
+            self.thing.dumpKeys(t.name, r['response']['CertificatePem'], keys[r['offset']])
+            results[t.id] = ProvisionedThing(t, arns['thing'], arns['certificate'])
+        for r in self._readReport(taskId, 'ERRORS'):
+            self.errors[new[r['offset']].id] = r.get('errorMessage', 'Registration failed')
+        s3.delete_object(Bucket=self.bucket, Key=key)
+        logSuccess('Registered {0} things, {1} errors'.format(len(results), len(self.errors)))
+        return results
@@ -0,0 +1,70 @@
+from .hashing import assignIds
+from .model import Route
+
+
+class RouteCompiler:
+    """
+    Compile the Routes of the configuration into Greengrass subscriptions.
+
+    Route endpoints reference things and lambdas by their configuration id:
+        thing:<id>              replaced by the thing arn
+        lambda:<id>             replaced by the lambda arn
+        shadow:<id>:<op>        (Subject only) replaced by $aws/things/<thing name>/shadow<op>
+    Anything else (cloud, GGShadowService, arns, plain topics) is kept as is.
+
+    Ids are resolved through hash indexes built once and the routes of the configuration are never
+    modified. Routes are only compiled when the RebuildPlan finds the subscription definition dirty,
+    so nothing is cached here.
+    """
+
+    def __init__(self, things, lambdas):
+        """
+        Parameters:
+            things: the provisioned things, an iterable of model.ProvisionedThing
+            lambdas: the Lambdas of the configuration, a dictionary id -> {arn, FunctionConfiguration}
+        """
+        self.thingArns = {}
+        self.thingNames = {}
+        for t in things:
+            self.thingArns[t.id] = t.thingArn
+            self.thingNames[t.id] = t.name
+        self.lambdaArns = dict((k, v['arn']) for k, v in lambdas.items())
+
+    @staticmethod
+    def tokenize(endpoint):
+        """
+        Split an endpoint into (kind, id, op), kind is None when the endpoint is not a reference
+        """
+        kind, sep, rest = endpoint.partition(':')
+        if not sep or kind not in ('thing', 'lambda', 'shadow'):
+            return None, endpoint, None
+        if kind == 'shadow':
+            id, _, op = rest.partition(':')
+            return kind, id, op
+        return kind, rest, None
+
+    def _resolveEndpoint(self, endpoint):
+        kind, id, _ = self.tokenize(endpoint)
+        if kind == 'thing':
+            if id not in self.thingArns:
+                raise NameError("Thing {0} not found".format(id))
+            return self.thingArns[id]
+        if kind == 'lambda':
+            if id not in self.lambdaArns:
+                raise NameError("Lambda {0} not found".format(id))
+            return self.lambdaArns[id]
+        return endpoint
+
+    def _resolveSubject(self, subject):
+        kind, id, op = self.tokenize(subject)
+        if kind == 'shadow':
+            if id not in self.thingNames:
+                raise NameError("Shadow of thing {0} not found".format(id))
+            return '$aws/things/{0}/shadow{1}'.format(self.thingNames[id], op)
+        return subject
+
+    def compile(self, routes):
+        """
+        Return the subscriptions of routes, an iterable of routes in the configuration format
+        """
+        return assignIds([Route(self._resolveEndpoint(r['Source']), self._resolveSubject(r['Subject']), self._resolveEndpoint(r['Target'])).toSubscription() for r in routes])
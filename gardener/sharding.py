@@ -0,0 +1,215 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from .config import Config
+from .gardener import Gardener
+from .function import FunctionDefinition
+from .logger import LoggerDefinition
+from .routes import RouteCompiler
+from .plan import RebuildPlan
+from .executor import DependencyExecutor, DEFAULT_WORKERS
+from .catalog import DefinitionCatalog
+from .policy import PolicyRegistry
+from .provisioning import DEFAULT_PROVISIONING_WORKERS
+from .clients import defaultRegistry
+from .credentials import openCredentialStore
+from .logging import logError, logInfo
+
+# Greengrass limit of devices per group
+MAX_GROUP_DEVICES = 2500
+
+
+def shardName(name, shard):
+    """
+    Name of a group or core in a shard, the first shard keeps the configured names
+    """
+    return name if shard == 0 else '{0}_shard{1}'.format(name, shard)
+
+
+class ShardPlan:
+    """
+    Partition the things of a config into shards of at most maxThings things, one group per shard.
+
+    key is a pattern over the thing id and configuration, including the variables of templated
+    things, e.g. "{site}" or "{name:.8}": things with the same key are kept in the same shard unless
+    there are more than maxThings of them. Without key, things are split in configuration order.
+    Routes go to the shard of the things they reference, routes referencing no thing go to every
+    shard and routes between things of different shards are rejected. A config that fits in one
+    group is never split.
+
+    The config is read once: the things and routes of each shard are kept to build its config.
+    """
+    def __init__(self, config, maxThings=MAX_GROUP_DEVICES, key=None):
+        if maxThings < 1:
+            raise ValueError('At least 1 thing per shard is required')
+        self.config = config
+        self.maxThings = maxThings
+        self.key = key
+        self.things = {}
+        self.shardThings = []
+        self.shardRoutes = []
+        self.count = 1
+        config.checkRouteTemplates()
+        total = sum(1 for _ in config.iterThings())
+        if total > maxThings:
+            self._assign()
+            self._checkRoutes()
+
+    def _thingKey(self, id, spec):
+        try:
+            return self.key.format(id=id, **spec)
+        except (KeyError, IndexError) as e:
+            raise ValueError('Sharding key {0} cannot be applied to thing {1}: {2} not found'.format(self.key, id, e))
+
+    def _assign(self):
+        groups = OrderedDict()
+        for k, v in self.config.iterThings():
+            groups.setdefault(self._thingKey(k, v) if self.key is not None else None, []).append((k, v))
+        shard = 0
+        used = 0
+        self.shardThings = [OrderedDict()]
+        for key in sorted(groups, key=lambda x: '' if x is None else x):
+            things = groups.pop(key)
+            # Start a new shard rather than splitting a key that fits in one
+            if used > 0 and used + len(things) > self.maxThings and len(things) <= self.maxThings:
+                shard += 1
+                used = 0
+                self.shardThings.append(OrderedDict())
+            for k, v in things:
+                if used == self.maxThings:
+                    shard += 1
+                    used = 0
+                    self.shardThings.append(OrderedDict())
+                self.things[k] = shard
+                self.shardThings[shard][k] = v
+                used += 1
+        self.count = shard + 1
+
+    def shardOf(self, id):
+        return self.things.get(id, 0)
+
+    def routeShard(self, route):
+        """
+        Shard of the things referenced by a route, None when it references no thing.
+        Raise a ValueError when the things are in different shards.
+        """
+        ids = []
+        for endpoint in (route['Source'], route['Target']):
+            kind, id, _ = RouteCompiler.tokenize(endpoint)
+            if kind == 'thing':
+                ids.append(id)
+        kind, id, _ = RouteCompiler.tokenize(route['Subject'])
+        if kind == 'shadow':
+            ids.append(id)
+        shards = set(self.things[id] for id in ids if id in self.things)
+        if len(shards) > 1:
+            raise ValueError('Route {0} -> {1} ({2}) spans shards {3}'.format(route['Source'], route['Target'], route['Subject'], sorted(shards)))
+        return shards.pop() if shards else None
+
+    def _checkRoutes(self):
+        errors = []
+        self.shardRoutes = [[] for i in range(self.count)]
+        for r in self.config.iterRoutes():
+            try:
+                shard = self.routeShard(r)
+            except ValueError as e:
+                errors.append(str(e))
+                continue
+            for i in (range(self.count) if shard is None else [shard]):
+                self.shardRoutes[i].append(r)
+        if errors:
+            raise ValueError('\n'.join(errors))
+
+    def shardConfig(self, shard):
+        """
+        Config of the group of a shard. Lambdas, Loggers and Policies are shared with the config.
+        """
+        config = Config()
+        config.Region = self.config.Region
+        config.Group = dict(self.config.Group, name=shardName(self.config.Group['name'], shard))
+        if shard == 0:
+            config.Cores = self.config.Cores
+        else:
+            config.Cores = dict((shardName(k, shard), dict(v, name=shardName(v['name'], shard))) for k, v in self.config.Cores.items())
+        config.Lambdas = self.config.Lambdas
+        config.Loggers = self.config.Loggers
+        config.Policies = self.config.Policies
+        config.Things = self.shardThings[shard]
+        config.Routes = self.shardRoutes[shard]
+        return config
+
+
+class ShardedGardener:
+    """
+    Deploy a config whose things do not fit in one group as several groups, see ShardPlan.
+
+    The limit and the locality key come from the Sharding section of the config. Every shard group
+    has its own core, named after the configured one, and its own credentials. The function and
+    logger definitions do not depend on the core and are created once and shared by all the shard
+    groups, which are then deployed concurrently on shardWorkers threads. A config that fits in one
+    group is deployed by a single Gardener, exactly as without sharding.
+    """
+    def __init__(self, config, workers=DEFAULT_WORKERS, clients=None, catalog=None, policies=None, provisioningWorkers=DEFAULT_PROVISIONING_WORKERS, state=None,
+            credentialsDir='.', credentialsFormat=None, shardWorkers=DEFAULT_WORKERS):
+        self.config = config
+        self.workers = workers
+        self.clients = clients if clients is not None else defaultRegistry()
+        self.gg = self.clients.client('greengrass', self.config.Region)
+        self.catalog = catalog if catalog is not None else DefinitionCatalog(self.gg)
+        self.policies = policies if policies is not None else PolicyRegistry(self.clients.client('iot', self.config.Region))
+        self.provisioningWorkers = provisioningWorkers
+        self.state = state
+        self.credentialsDir = credentialsDir
+        self.credentialsFormat = credentialsFormat
+        self.shardWorkers = shardWorkers
+        self.gardeners = []
+
+    @property
+    def changed(self):
+        return any(g.group.changed for g in self.gardeners if hasattr(g, 'group'))
+
+    def _gardener(self, config, shared=None):
+        credentials = openCredentialStore(self.credentialsDir, self.credentialsFormat, config.Group['name'])
+        return Gardener(config, self.workers, self.clients, self.catalog, self.policies, self.provisioningWorkers, self.state, credentials, shared)
+
+    def _createShared(self, config):
+        plan = RebuildPlan(config, self.state)
+        shared = {
+            'function': FunctionDefinition(self.gg, config, self.catalog, state=self.state, plan=plan),
+            'logger': LoggerDefinition(self.gg, config, self.catalog, state=self.state, plan=plan)
+        }
+        executor = DependencyExecutor(len(shared))
+        for name, definition in shared.items():
+            executor.add(name, definition.create)
+        if not executor.run():
+            raise RuntimeError('The shared definitions of group {0} could not be created'.format(self.config.Group['name']))
+        return shared
+
+    def createGreengrass(self):
+        """
+        Deploy every shard group and return the core config file of each, by group name
+        """
+        sharding = self.config.Sharding
+        plan = ShardPlan(self.config, sharding.get('maxThings', MAX_GROUP_DEVICES), sharding.get('key'))
+        if plan.count == 1:
+            self.gardeners = [self._gardener(self.config)]
+            return OrderedDict([(self.config.Group['name'], self.gardeners[0].createGreengrass())])
+
+        logInfo('Splitting the {0} things of group {1} into {2} groups'.format(len(plan.things), self.config.Group['name'], plan.count))
+        configs = [plan.shardConfig(i) for i in range(plan.count)]
+        # The first shard has the configured group name, the shared definitions are named after it
+        shared = self._createShared(configs[0])
+        self.gardeners = [self._gardener(c, shared) for c in configs]
+
+        def deploy(gardener):
+            try:
+                return gardener.createGreengrass(), None
+            except Exception as e:
+                logError('Group {0} failed: {1}'.format(gardener.config.Group['name'], e))
+                return None, e
+
+        with ThreadPoolExecutor(max_workers=self.shardWorkers) as pool:
+            results = list(pool.map(deploy, self.gardeners))
+        failed = [g.config.Group['name'] for g, (_, e) in zip(self.gardeners, results) if e is not None]
+        if failed:
+            raise RuntimeError('Groups {0} could not be deployed'.format(', '.join(failed)))
+        return OrderedDict((g.config.Group['name'], content) for g, (content, _) in zip(self.gardeners, results))
@@ -0,0 +1,97 @@
+import os
+import json
+import time
+import tempfile
+import threading
+
+DEFAULT_STATE_FILE = '.gardener_state.json'
+DEFAULT_MAX_AGE = 24 * 3600
+
+
+class DeploymentState:
+    """
+    Local record of what was deployed, so that unchanged definitions can be reused without
+    fetching their latest version from Greengrass.
+
+    For each group the state keeps, per entity (core, device, function, logger, subscription, group),
+    the definition id, the version arn and the fingerprint of the deployed content, along with the
+    fingerprint of the config sections it was built from. It also keeps the thing and certificate
+    arns of the provisioned cores and things. An entry is only returned when its fingerprint
+    matches and it is younger than maxAge seconds; refresh ignores the whole state, which is then
+    rewritten by the run.
+    """
+    def __init__(self, path=DEFAULT_STATE_FILE, maxAge=DEFAULT_MAX_AGE, refresh=False):
+        self.path = path
+        self.maxAge = maxAge
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        self.groups = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.groups = json.load(f).get('groups', {})
+
+    @staticmethod
+    def groupKey(config):
+        return '{0}/{1}'.format(config.Region, config.Group['name'])
+
+    def _fresh(self, entry, key, fingerprint):
+        if self.refresh or entry is None or entry.get(key) != fingerprint:
+            return None
+        if self.maxAge is not None and time.time() - entry['updatedAt'] > self.maxAge:
+            return None
+        return dict(entry)
+
+    def getWhere(self, config, entity, field, value):
+        """
+        Return the entry of entity if its field has value
+        """
+        with self._lock:
+            entry = self.groups.get(self.groupKey(config), {}).get(entity)
+        return self._fresh(entry, field, value)
+
+    def get(self, config, entity, fingerprint):
+        return self.getWhere(config, entity, 'fingerprint', fingerprint)
+
+    def getUnchanged(self, config, entity, source):
+        """
+        Return the entry of entity if it was built from config sections with the fingerprint source
+        """
+        return self.getWhere(config, entity, 'source', source)
+
+    def record(self, config, entity, entry):
+        entry = dict(entry, updatedAt=time.time())
+        with self._lock:
+            self.groups.setdefault(self.groupKey(config), {})[entity] = entry
+
+    def getThing(self, config, section, id, fingerprint):
+        with self._lock:
+            entry = self.groups.get(self.groupKey(config), {}).get(section, {}).get(id)
+        return self._fresh(entry, 'fingerprint', fingerprint)
+
+    def recordThing(self, config, section, id, entry):
+        """
+        Record the provisioning result of a thing of section (cores or things)
+        """
+        entry = dict(entry, updatedAt=time.time())
+        with self._lock:
+            self.groups.setdefault(self.groupKey(config), {}).setdefault(section, {})[id] = entry
+
+    def forget(self, config):
+        with self._lock:
+            self.groups.pop(self.groupKey(config), None)
+
+    def save(self):
+        """
+        Write the state atomically, a crash while saving leaves the previous state in place
+        """
+        with self._lock:
+            content = json.dumps({'groups': self.groups}, indent=2, sort_keys=True)
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix='.gardener_state')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    f.write(content)
+                os.replace(tmp, self.path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
@@ -0,0 +1,92 @@
+import os
+import csv
+
+
+def _format(value, variables):
+    if isinstance(value, str):
+        return value.format(**variables)
+    if isinstance(value, dict):
+        return dict((k, _format(v, variables)) for k, v in value.items())
+    if isinstance(value, list):
+        return [_format(v, variables) for v in value]
+    return value
+
+
+class ThingTemplate:
+    """
+    Things generated from a pattern, for large fleets of identical devices:
+        {
+            "id": "sensor{i:04d}",
+            "name": "site1_sensor{i:04d}",
+            "range": [0, 10000],
+            "syncShadow": false,
+            "policy": "thing_policy"
+        }
+    Instead of range, csv names a CSV file (relative to the config file) with a header line; every
+    row is a thing and its columns can be used in the patterns. {i} is the row index in both cases,
+    {id} can also be used in name. Things are generated one by one, when iterated. The variables
+    of a thing other than id are kept in its configuration, so that a sharding key can use them.
+    """
+    def __init__(self, name, spec, base=None):
+        self.name = name
+        self.spec = spec
+        if 'id' not in spec or 'name' not in spec or 'policy' not in spec:
+            raise ValueError('Thing template {0} requires id, name and policy'.format(name))
+        if ('range' in spec) == ('csv' in spec):
+            raise ValueError('Thing template {0} requires either range or csv'.format(name))
+        self.csv = os.path.join(base, spec['csv']) if 'csv' in spec and base is not None else spec.get('csv')
+
+    def rows(self):
+        """
+        Iterate over the template variables of each thing
+        """
+        if self.csv is None:
+            for i in range(*self.spec['range']):
+                yield {'i': i}
+        else:
+            with open(self.csv, newline='') as f:
+                for i, row in enumerate(csv.DictReader(f)):
+                    row['i'] = i
+                    yield row
+
+    def variables(self):
+        """
+        Iterate over the variables of each thing, including its id and name
+        """
+        for row in self.rows():
+            row['id'] = self.spec['id'].format(**row)
+            row['name'] = self.spec['name'].format(**row)
+            yield row
+
+    def records(self):
+        """
+        Iterate over the (id, spec) pairs of the things
+        """
+        for row in self.variables():
+            id = row.pop('id')
+            row['syncShadow'] = self.spec.get('syncShadow', False)
+            row['policy'] = self.spec['policy']
+            yield id, row
+
+
+class RouteTemplate:
+    """
+    Routes repeated for every thing of a thing template:
+        {
+            "forEach": "sensors",
+            "Source": "thing:{id}",
+            "Subject": "sensors/{name}/data",
+            "Target": "lambda:collector"
+        }
+    The patterns can use the variables of the thing template ({i}, {id}, {name} and the CSV columns).
+    """
+    def __init__(self, spec, thingTemplates):
+        if spec.get('forEach') not in thingTemplates:
+            raise ValueError('Route template refers to unknown thing template {0}'.format(spec.get('forEach')))
+        self.spec = spec
+        self.things = thingTemplates[spec['forEach']]
+
+    def records(self):
+        route = dict((k, v) for k, v in self.spec.items() if k != 'forEach')
+        for row in self.things.variables():
+            yield _format(route, row)
@@ -1,35 +1,32 @@
 
-import boto3
 import json
 from .logging import logError, logInfo, logRecycle, logSuccess, logDebug
-import uuid
+from .hashing import assignIds
 from .globals import CERT_POSTFIX, KEY_POSTFIX
+from .policy import PolicyRegistry
+from .clients import defaultRegistry
+from .credentials import FileCredentialStore
 
 class Thing():
 
-    def __init__(self, config):
+    def __init__(self, config, policies=None, clients=None, credentials=None):
         self.config = config
-        self.iot = boto3.client('iot', region_name=self.config.Region)
+        self.credentials = credentials if credentials is not None else FileCredentialStore('.', fsyncBatch=1, background=False)
+        self.clients = clients if clients is not None else defaultRegistry()
+        self.iot = self.clients.client('iot', self.config.Region)
+        self.policies = policies if policies is not None else PolicyRegistry(self.iot)
         self.entityName = "thing"
 
     def dumpKeys(self, name, cert, privkey):
-        print('Certificate PEM')
-        with open(name+CERT_POSTFIX, 'w') as f:
-            f.write(cert)
-
-        print(cert)
-        print('PrivateKey')
-
-        with open(name+KEY_POSTFIX, 'w') as f:
-            f.write(privkey)
-        print(privkey)
+        self.credentials.put(name, cert, privkey)
+        logDebug('Stored certificate and private key of {0}'.format(name))
 
     def createThing(self, name, policy):
         res = self.iot.create_thing(thingName=name)
         thingArn = res['thingArn']
         res = self.iot.list_thing_principals(thingName=name)
         principals = res['principals']
-        logDebug(principals)
+        logDebug('Principals of {0}: {1}'.format(name, principals))
         if not policy in self.config.Policies:
             logError('Missing policy {0} from configuration'.format(policy))
         policyDoc = self.config.Policies[policy]
@@ -60,28 +57,11 @@ class Thing():
 
 
     def getThingDefinition(self, things):
-        return [
-            {
-                "ThingArn": t['thingArn'],
-                "SyncShadow":t['syncShadow'],
-                "CertificateArn":t['certArn'],
-                "Id":str(uuid.uuid4())
-            }
-            for t in things]
+        """
+        Devices of a definition version, things is an iterable of model.ProvisionedThing
+        """
+        return assignIds([t.toDevice() for t in things])
 
     def _createOrUpdatePolicy(self, policyName, policyDoc):
-        policies = dict([(x['policyName'], x['policyArn']) for x in self.iot.list_policies()['policies']])
-
-        if policyName + '_Policy' in policies.keys():
-            currentPolicyDoc = self.iot.get_policy(policyName=policyName + '_Policy')['policyDocument']
-            #logInfo(currentPolicyDoc)
-            if policyDoc == json.loads(currentPolicyDoc):
-                logInfo('Policies are identical')
-            # Should check if policies are identical
-            logRecycle('Policy {0} already exists with arn {1}'.format(
-                policyName + '_Policy', policies[policyName + '_Policy']))
-        else:
-            res = self.iot.create_policy(
-                policyName=policyName + "_Policy", policyDocument=json.dumps(policyDoc))
-            logSuccess('Created policy {0}'.format(res['policyArn']))
+        self.policies.ensure(policyName + '_Policy', policyDoc)
         return policyName
\ No newline at end of file
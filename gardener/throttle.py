@@ -0,0 +1,198 @@
+import time
+import random
+import threading
+from .metrics import RETRY_EVENT
+
+THROTTLING_ERRORS = set([
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'TooManyRequestsException',
+    'RequestLimitExceeded',
+    'RequestThrottled',
+    'RequestThrottledException'
+])
+
+DEFAULT_RATES = {
+    'greengrass': (10.0, 10),
+    'iot': (10.0, 10)
+}
+DEFAULT_RATE = (10.0, 10)
+
+# Methods of the boto3 clients that do not call the service
+PASSTHROUGH = set(['get_paginator', 'get_waiter', 'can_paginate', 'generate_presigned_url', 'close'])
+
+
+class TokenBucket:
+    """
+    Token bucket limiting the request rate: rate tokens are added per second, up to burst.
+
+    The rate adapts to the service: it is reduced when calls are throttled, at most once per
+    second so that concurrent workers hitting the same burst count once, and grows back towards
+    its configured value with every successful call.
+    """
+    def __init__(self, rate, burst):
+        self.maxRate = float(rate)
+        self.minRate = self.maxRate / 5
+        self.rate = self.maxRate
+        self.decreased = 0.0
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take a token, waiting for it if needed, and return the time spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def throttled(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - self.decreased >= 1:
+                self.rate = max(self.minRate, self.rate * 0.7)
+                self.decreased = now
+
+    def succeeded(self):
+        with self._lock:
+            if self.rate < self.maxRate:
+                self.rate = min(self.maxRate, self.rate + self.maxRate / 20)
+
+
+class ClientStats:
+    """
+    Counters of a service/region: calls, retries, throttled calls, failed calls and the time spent
+    waiting for the limiter and backing off
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.errors = 0
+        self.limiterWait = 0.0
+        self.backoffWait = 0.0
+
+    def add(self, **kwargs):
+        with self._lock:
+            for k, v in kwargs.items():
+                setattr(self, k, getattr(self, k) + v)
+
+    def toDict(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'retries': self.retries,
+                'throttled': self.throttled,
+                'errors': self.errors,
+                'limiterWait': round(self.limiterWait, 3),
+                'backoffWait': round(self.backoffWait, 3)
+            }
+
+
+_lock = threading.Lock()
+_buckets = {}
+_stats = {}
+
+
+def setRate(service, rate, burst=None):
+    """
+    Change the rate limit of a service, for the limiters created afterwards
+    """
+    DEFAULT_RATES[service] = (rate, burst if burst is not None else max(1, int(rate)))
+
+
+def _shared(service, region):
+    key = (service, region)
+    with _lock:
+        if key not in _buckets:
+            _buckets[key] = TokenBucket(*DEFAULT_RATES.get(service, DEFAULT_RATE))
+            _stats[key] = ClientStats()
+        return _buckets[key], _stats[key]
+
+
+def allStats():
+    with _lock:
+        items = list(_stats.items())
+    return dict(('{0}/{1}'.format(service, region), s.toDict()) for (service, region), s in items)
+
+
+def isRetryable(error):
+    # botocore is only imported once a call failed, it is always loaded by then
+    from botocore.exceptions import ClientError
+    if not isinstance(error, ClientError):
+        return False
+    code = error.response.get('Error', {}).get('Code')
+    status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0)
+    return code in THROTTLING_ERRORS or status >= 500
+
+
+class RateLimitedClient:
+    """
+    Wrapper of a boto3 client sharing one token bucket with every other client of the same service
+    and region, and retrying throttled and 5xx calls with jittered exponential backoff.
+    """
+    def __init__(self, client, service, region, maxAttempts=8, baseDelay=0.2, maxDelay=20.0):
+        self.client = client
+        self.service = service
+        self.region = region
+        self.maxAttempts = maxAttempts
+        self.baseDelay = baseDelay
+        self.maxDelay = maxDelay
+        self.bucket, self.stats = _shared(service, region)
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if name.startswith('_') or name in PASSTHROUGH or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            return self._call(name, attr, *args, **kwargs)
+        return call
+
+    def _retried(self, name, attempt, delay):
+        # Let the handlers registered on the client events, such as the metrics, see the retry
+        meta = getattr(self.client, 'meta', None)
+        events = getattr(meta, 'events', None)
+        if events is None:
+            return
+        operation = getattr(meta, 'method_to_api_mapping', {}).get(name) or ''.join(x.capitalize() for x in name.split('_'))
+        events.emit('{0}.{1}.{2}'.format(RETRY_EVENT, self.service, operation), attempt=attempt, delay=delay)
+
+    def _call(self, name, method, *args, **kwargs):
+        attempt = 0
+        while True:
+            self.stats.add(calls=1, limiterWait=self.bucket.acquire())
+            try:
+                res = method(*args, **kwargs)
+                self.bucket.succeeded()
+                return res
+            except Exception as e:
+                attempt += 1
+                if not isRetryable(e) or attempt >= self.maxAttempts:
+                    self.stats.add(errors=1)
+                    raise
+                throttled = e.response.get('Error', {}).get('Code') in THROTTLING_ERRORS
+                if throttled:
+                    self.bucket.throttled()
+                # Full jitter: spread the retries of concurrent workers over the whole interval
+                delay = random.uniform(0, min(self.maxDelay, self.baseDelay * 2 ** attempt))
+                self.stats.add(retries=1, throttled=1 if throttled else 0, backoffWait=delay)
+                self._retried(name, attempt, delay)
+                time.sleep(delay)
+
+
+def wrapClient(client, service, region):
+    return RateLimitedClient(client, service, region)
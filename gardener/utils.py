@@ -1,4 +1,5 @@
 import json
+from .hashing import entityDigest, definitionDigests
 
 def jsonPP(j):
     print(json.dumps(j, indent=2))
@@ -7,26 +8,27 @@ def dicSlice(d, keys):
     return dict((k, d[k]) for k in keys if k in d)
 
 def hashDict(d, ignore=[]):
-        """
-        Creates an hash/uuid of a dictionary ignoring specific keys
-        TODO: Bundle this in a util package
-        """
-        s = ""
-        keys = list(d.keys())
-        keys.sort()
-        for k in keys:
-            if not k in ignore:
-                s += str(k)+str(d[k])
-        return s
+    """
+    Creates an hash of a dictionary ignoring specific keys
+    """
+    return entityDigest(d, ignore)
 
 def compareDict(a, b):
     """
     Compare two definitions removing the unique Ids from the entities
     """
     ignore = ['Id']
-    _a = [hashDict(dict(x), ignore) for x in a]
-    _b = [hashDict(dict(y), ignore) for y in b]
-    _a.sort()
-    _b.sort()
-    
-    return _a == _b
\ No newline at end of file
+    return definitionDigests(a, ignore) == definitionDigests(b, ignore)
+
+def paginate(method, key, tokenIn='NextToken', tokenOut='NextToken', **kwargs):
+    """
+    Call a list_* API method until all pages have been read and return the concatenated items
+    """
+    items = []
+    while True:
+        res = method(**kwargs)
+        items.extend(res.get(key, []))
+        token = res.get(tokenOut)
+        if not token:
+            return items
+        kwargs[tokenIn] = token
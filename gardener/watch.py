@@ -0,0 +1,130 @@
+import sys
+import json
+import time
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from .catalog import DefinitionCatalog
+from .utils import paginate
+
+TERMINAL_STATUSES = ('Success', 'Failure')
+NOT_FOUND = 'NotFound'
+NO_DEPLOYMENT = 'NoDeployment'
+POLL_FAILED = 'PollFailed'
+DEFAULT_MAX_ERRORS = 5
+
+
+class _Watched:
+    def __init__(self, name):
+        self.name = name
+        self.groupId = None
+        self.deploymentId = None
+        self.status = None
+        self.interval = 0
+        self.nextPoll = 0
+        self.errors = 0
+
+    def done(self):
+        return self.status in TERMINAL_STATUSES + (NOT_FOUND, NO_DEPLOYMENT, POLL_FAILED)
+
+
+class DeploymentWatcher:
+    """
+    Follow the latest deployment of many groups until every one of them succeeded or failed.
+
+    Group names are resolved through the paginated group index and the statuses are polled
+    concurrently. Every group is polled every minInterval seconds while its status changes, and
+    less and less often (up to maxInterval) while it does not. Each status change is written to
+    out as a JSON line.
+
+    A failing call only concerns its group: the error is written as an event with pollError and
+    the group is polled again after a growing delay. After maxErrors consecutive errors the group
+    is given up with the status PollFailed.
+    """
+    def __init__(self, gg, groupNames, catalog=None, workers=8, minInterval=2.0, maxInterval=30.0, out=sys.stdout, maxErrors=DEFAULT_MAX_ERRORS):
+        self.gg = gg
+        self.catalog = catalog if catalog is not None else DefinitionCatalog(gg)
+        self.workers = workers
+        self.minInterval = minInterval
+        self.maxInterval = maxInterval
+        self.out = out
+        self.maxErrors = maxErrors
+        self.groups = [_Watched(n) for n in groupNames]
+
+    def _emit(self, w, extra=None):
+        event = {
+            'time': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'group': w.name,
+            'groupId': w.groupId,
+            'deploymentId': w.deploymentId,
+            'status': w.status
+        }
+        event.update(extra or {})
+        self.out.write(json.dumps(event) + '\n')
+        self.out.flush()
+
+    def _resolve(self, w):
+        """
+        Find the group id and the latest deployment of w, return NotFound or NoDeployment when there are none
+        """
+        groups = self.catalog.find('group', w.name)
+        if len(groups) != 1:
+            return NOT_FOUND
+        w.groupId = groups[0]['Id']
+        deployments = paginate(self.gg.list_deployments, 'Deployments', GroupId=w.groupId)
+        if len(deployments) == 0:
+            return NO_DEPLOYMENT
+        w.deploymentId = max(deployments, key=lambda x: x['CreatedAt'])['DeploymentId']
+        return None
+
+    def _poll(self, w):
+        """
+        Return the deployment status, its error message and the error of the poll itself, if any
+        """
+        try:
+            if w.deploymentId is None:
+                status = self._resolve(w)
+                if status is not None:
+                    return status, None, None
+            res = self.gg.get_deployment_status(DeploymentId=w.deploymentId, GroupId=w.groupId)
+            return res['DeploymentStatus'], res.get('ErrorMessage'), None
+        except Exception as e:
+            return w.status, None, str(e)
+
+    def _pollFailed(self, w, error):
+        w.errors += 1
+        if w.errors >= self.maxErrors:
+            w.status = POLL_FAILED
+            self._emit(w, {'pollError': error})
+            return
+        self._emit(w, {'pollError': error, 'errors': w.errors})
+        w.interval = min(self.maxInterval, max(self.minInterval, w.interval * 2))
+        w.nextPoll = time.monotonic() + w.interval
+
+    def watch(self, timeout=None):
+        """
+        Return a dictionary group name -> last status, once all deployments are finished or after timeout seconds
+        """
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while True:
+                pending = [w for w in self.groups if not w.done()]
+                if not pending or (timeout is not None and time.monotonic() - start > timeout):
+                    break
+                now = time.monotonic()
+                due = [w for w in pending if w.nextPoll <= now]
+                for w, (status, error, pollError) in zip(due, pool.map(self._poll, due)):
+                    if pollError is not None:
+                        self._pollFailed(w, pollError)
+                        continue
+                    w.errors = 0
+                    if status != w.status:
+                        w.status = status
+                        w.interval = self.minInterval
+                        self._emit(w, {'errorMessage': error} if error else None)
+                    else:
+                        w.interval = min(self.maxInterval, max(self.minInterval, w.interval * 1.5))
+                    w.nextPoll = time.monotonic() + w.interval
+                pending = [w for w in pending if not w.done()]
+                if pending:
+                    time.sleep(max(0, min(w.nextPoll for w in pending) - time.monotonic()))
+        return dict((w.name, w.status) for w in self.groups)
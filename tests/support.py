@@ -0,0 +1,42 @@
+import io
+from gardener import throttle
+from gardener.config import Config
+from gardener.fake import FakeBackend
+from gardener.clients import ClientRegistry
+from gardener.logging import configureLogging
+
+REGION = 'us-east-1'
+POLICY = {"Version": "2012-10-17", "Statement": [{"Effect": "Allow", "Action": ["iot:*"], "Resource": ["*"]}]}
+
+# The fake backend answers at once, the rate limits would only slow the tests down
+throttle.setRate('greengrass', 1000.0)
+throttle.setRate('iot', 1000.0)
+configureLogging(stream=io.StringIO())
+
+
+def makeConfig(group='g1', things=3, deploy=True):
+    """
+    A group with a core, things routed to a lambda and a shadow route between the first two things
+    """
+    config = Config()
+    config.Region = REGION
+    config.addPolicy('thing_policy', POLICY)
+    config.addGroup(group, 'arn:aws:iam::123456789012:role/greengrass', deploy)
+    config.addCore('core', group + '_core', True, 'thing_policy')
+    for i in range(things):
+        config.addThing('thing{0}'.format(i), '{0}_thing{1}'.format(group, i), i % 2 == 0, 'thing_policy')
+    config.addLambda('collector', 'arn:aws:lambda:us-east-1:123456789012:function:collector:1', {"Executable": "collector", "MemorySize": 128, "Timeout": 3})
+    for i in range(things):
+        config.addRoute('thing:thing{0}'.format(i), 'data/{0}'.format(i), 'lambda:collector')
+    if things > 1:
+        config.addRoute('GGShadowService', 'shadow:thing0:/update/rejected', 'thing:thing1')
+    config.Loggers = [{"Component": "Lambda", "Level": "INFO", "Space": 1024, "Type": "FileSystem"}]
+    return config
+
+
+def fakeClients():
+    """
+    Return a fake backend and a client registry answering from it
+    """
+    backend = FakeBackend()
+    return backend, ClientRegistry(factory=backend.factory)
@@ -0,0 +1,51 @@
+import shutil
+import tempfile
+import unittest
+from tests.support import REGION, makeConfig, fakeClients
+from gardener.gardener import Gardener
+from gardener.cleanup import CleanupEngine
+from gardener.credentials import FileCredentialStore
+
+
+class CleanupEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.backend, self.clients = fakeClients()
+        for name in ('keep1', 'drop1', 'drop2'):
+            Gardener(makeConfig(name), clients=self.clients, credentials=FileCredentialStore(self.dir)).createGreengrass()
+        self.gg = self.clients.client('greengrass', REGION)
+        self.backend.reset()
+
+    def names(self, kind):
+        return sorted(x['Name'] for x in CleanupEngine(self.gg).catalog.listAll(kind))
+
+    def testDryRunOnlyReads(self):
+        plan = CleanupEngine(self.gg, prefix='drop').plan()
+        self.assertEqual(sorted(g['Name'] for g in plan.groups), ['drop1', 'drop2'])
+        self.assertEqual(sorted(g['Name'] for g in plan.resets), ['drop1', 'drop2'])
+        self.assertEqual(sorted(x['Name'] for x in plan.definitions['cores']), ['drop1_core_definition', 'drop2_core_definition'])
+        self.assertEqual([k for k in self.backend.callCounts() if not k.split('.')[1].startswith(('List', 'Get'))], [])
+
+    def testDeletesInDependencyOrder(self):
+        engine = CleanupEngine(self.gg, prefix='drop')
+        self.assertTrue(engine.execute(engine.plan()))
+        operations = [o for s, o, _ in self.backend.calls if o.startswith(('Reset', 'Delete'))]
+        resets = [i for i, o in enumerate(operations) if o == 'ResetDeployments']
+        groups = [i for i, o in enumerate(operations) if o == 'DeleteGroup']
+        definitions = [i for i, o in enumerate(operations) if o.endswith('Definition')]
+        self.assertEqual((len(resets), len(groups), len(definitions)), (2, 2, 10))
+        self.assertLess(max(resets), min(groups))
+        self.assertLess(max(groups), min(definitions))
+        self.assertEqual(self.names('group'), ['keep1'])
+        self.assertEqual(self.names('device'), ['keep1_device_defintion'])
+
+    def testReferencedDefinitionsAreKept(self):
+        engine = CleanupEngine(self.gg, orphanedOnly=True)
+        plan = engine.plan()
+        self.assertEqual(plan.groups, [])
+        self.assertEqual(sum(len(v) for v in plan.definitions.values()), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from tests.support import POLICY
+from gardener.config import Config
+
+
+class ConfigBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.config = Config()
+        self.config.addPolicy('p', POLICY)
+        self.config.addLambda('collector', 'arn:collector', {})
+
+    def testAddThingsValidatesEveryThingFirst(self):
+        with self.assertRaises(ValueError) as e:
+            self.config.addThings([{'id': 't0', 'name': 'n0', 'policy': 'p'}, {'id': 't1', 'policy': 'x'}, {'id': 't2', 'policy': 'y'}])
+        self.assertEqual(str(e.exception).splitlines(), ['Thing t1: Policy not found', 'Thing t2: Policy not found'])
+        self.assertEqual(self.config.Things, {})
+        self.config.addThings({'id': 't{0}'.format(i), 'name': 'n{0}'.format(i), 'policy': 'p'} for i in range(3))
+        self.assertEqual(self.config.Things['t2'], {'name': 'n2', 'syncShadow': False, 'policy': 'p'})
+
+    def testAddRoutesValidatesEveryRouteFirst(self):
+        self.config.addThings([{'id': 't0', 'name': 'n0', 'policy': 'p'}])
+        routes = [
+            {'Source': 'thing:t0', 'Subject': 'data', 'Target': 'lambda:collector'},
+            {'Source': 'thing:t9', 'Subject': 'shadow:t8:/update', 'Target': 'cloud'}
+        ]
+        with self.assertRaises(ValueError) as e:
+            self.config.addRoutes(routes)
+        self.assertEqual(str(e.exception).splitlines(), ['Route 1: Source not defined', 'Route 1: Shadow not defined'])
+        self.assertEqual(self.config.Routes, [])
+        self.config.addRoutes(routes[:1])
+        self.assertEqual(self.config.Routes, routes[:1])
+
+    def testEndpointsFollowReplacedSections(self):
+        self.config.addThing('t0', 'n0', False, 'p')
+        self.config.addRoute('thing:t0', 'data', 'cloud')
+        self.config.Things = {'t1': {'name': 'n1', 'syncShadow': False, 'policy': 'p'}}
+        with self.assertRaisesRegex(ValueError, 'Source not defined'):
+            self.config.addRoute('thing:t0', 'data', 'cloud')
+        self.config.addRoute('thing:t1', 'data', 'cloud')
+
+
+class ConfigShardTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        os.makedirs(os.path.join(self.dir, 'things'))
+        os.makedirs(os.path.join(self.dir, 'routes'))
+        self.write('things/a.json', json.dumps({'t0': {'name': 'n0', 'policy': 'p'}}))
+        self.write('things/b.jsonl', '\n'.join(json.dumps({'id': 't{0}'.format(i), 'name': 'n{0}'.format(i), 'policy': 'p'}) for i in (1, 2)) + '\n\n')
+        self.write('routes/a.jsonl', json.dumps({'Source': 'thing:t1', 'Subject': 'data', 'Target': 'cloud'}) + '\n')
+        self.manifest = {
+            'Group': {'name': 'g1', 'roleArn': 'arn:role', 'deploy': False},
+            'Region': 'us-east-1',
+            'Policies': {'p': POLICY},
+            'Things': {'inline': {'name': 'inline', 'policy': 'p'}},
+            'Routes': [],
+            'Include': {'Things': ['things/*.json', 'things/*.jsonl'], 'Routes': 'routes/*.jsonl'}
+        }
+
+    def write(self, name, content):
+        with open(os.path.join(self.dir, name), 'w') as f:
+            f.write(content)
+
+    def load(self):
+        self.write('config.json', json.dumps(self.manifest))
+        return Config(os.path.join(self.dir, 'config.json'))
+
+    def testShardsAreStreamedUntilRead(self):
+        config = self.load()
+        self.assertEqual([k for k, v in config.iterThings()], ['inline', 't0', 't1', 't2'])
+        self.assertEqual(list(config.iterRoutes()), [{'Source': 'thing:t1', 'Subject': 'data', 'Target': 'cloud'}])
+        self.assertIn('Things', config._shards)
+        self.assertEqual(sorted(config.Things), ['inline', 't0', 't1', 't2'])
+        self.assertNotIn('Things', config._shards)
+        self.assertEqual(config.Things['t2'], {'name': 'n2', 'policy': 'p'})
+
+    def testMissingShard(self):
+        self.manifest['Include']['Loggers'] = 'loggers/*.json'
+        with self.assertRaisesRegex(ValueError, 'No shard matches loggers'):
+            self.load()
+
+    def testSectionThatCannotBeIncluded(self):
+        self.manifest['Include']['Group'] = 'group.json'
+        with self.assertRaisesRegex(ValueError, 'Section Group cannot be included'):
+            self.load()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import stat
+import shutil
+import tarfile
+import zipfile
+import tempfile
+import unittest
+from tests.support import makeConfig, fakeClients
+from gardener.gardener import Gardener
+from gardener.credentials import CredentialStore, FileCredentialStore, openCredentialStore
+from gardener.globals import CERT_POSTFIX, KEY_POSTFIX
+
+
+def archiveFiles(path):
+    """
+    Return the files of an archive as a dictionary name -> (mode, content)
+    """
+    if path.endswith('.zip'):
+        with zipfile.ZipFile(path) as archive:
+            return dict((i.filename, (i.external_attr >> 16, archive.read(i).decode())) for i in archive.infolist())
+    with tarfile.open(path, 'r:gz') as archive:
+        return dict((m.name, (m.mode, archive.extractfile(m).read().decode())) for m in archive.getmembers())
+
+
+class ArchiveCredentialStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.backend, self.clients = fakeClients()
+
+    def deploy(self, config, format):
+        credentials = openCredentialStore(self.dir, format, config.Group['name'])
+        Gardener(config, clients=self.clients, credentials=credentials).createGreengrass()
+        return credentials.path
+
+    def checkArchive(self, format):
+        path = self.deploy(makeConfig(), format)
+        files = archiveFiles(path)
+        names = ['g1_core', 'g1_thing0', 'g1_thing1', 'g1_thing2']
+        self.assertEqual(sorted(files), sorted(n + p for n in names for p in (CERT_POSTFIX, KEY_POSTFIX)))
+        self.assertTrue(all(mode & 0o777 == 0o600 for mode, content in files.values()))
+        self.assertIn('PRIVATE KEY', files['g1_thing1' + KEY_POSTFIX][1])
+        # Only the archive is left in the directory
+        self.assertEqual(os.listdir(self.dir), [os.path.basename(path)])
+
+        # A later run adds its new things and keeps the files of the others
+        config = makeConfig()
+        config.Things['thing1']['name'] = 'g1_renamed'
+        self.assertEqual(self.deploy(config, format), path)
+        files2 = archiveFiles(path)
+        self.assertEqual(set(files2) - set(files), set(['g1_renamed' + CERT_POSTFIX, 'g1_renamed' + KEY_POSTFIX]))
+        self.assertEqual(files2['g1_thing1' + KEY_POSTFIX], files['g1_thing1' + KEY_POSTFIX])
+
+    def testTarArchive(self):
+        self.checkArchive('tar')
+
+    def testZipArchive(self):
+        self.checkArchive('zip')
+
+    def testUnknownFormat(self):
+        with self.assertRaises(ValueError):
+            openCredentialStore(self.dir, 'rar', 'g1')
+
+
+class FileCredentialStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def testFilesAreWrittenByBatches(self):
+        with FileCredentialStore(self.dir, fsyncBatch=4) as store:
+            for i in range(5):
+                store.put('thing{0}'.format(i), 'cert{0}'.format(i), 'key{0}'.format(i))
+        self.assertEqual(store.written, 5)
+        self.assertEqual(sorted(os.listdir(self.dir)), sorted('thing{0}{1}'.format(i, p) for i in range(5) for p in (CERT_POSTFIX, KEY_POSTFIX)))
+        path = os.path.join(self.dir, 'thing3' + KEY_POSTFIX)
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+        with open(path) as f:
+            self.assertEqual(f.read(), 'key3')
+        with self.assertRaises(RuntimeError):
+            store.put('late', 'cert', 'key')
+
+    def testFailedWritesAreRaisedOnClose(self):
+        class FailingStore(CredentialStore):
+            def _write(self, name, cert, privkey):
+                raise IOError('disk full')
+        store = FailingStore()
+        store.put('thing0', 'cert', 'key')
+        with self.assertRaisesRegex(RuntimeError, 'thing0'):
+            store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
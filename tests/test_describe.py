@@ -0,0 +1,49 @@
+import shutil
+import tempfile
+import unittest
+from tests.support import REGION, makeConfig, fakeClients
+from gardener.gardener import Gardener
+from gardener.describe import GroupDescriber, VersionCache, parseVersionArn
+from gardener.credentials import FileCredentialStore
+
+
+class GroupDescriberTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.backend, clients = fakeClients()
+        for name in ('g1', 'g2'):
+            Gardener(makeConfig(name), clients=clients, credentials=FileCredentialStore(self.dir)).createGreengrass()
+        self.gg = clients.client('greengrass', REGION)
+        self.cache = VersionCache(self.dir + '/versions')
+
+    def versionCalls(self):
+        return sum(v for k, v in self.backend.callCounts().items() if k.endswith('Version'))
+
+    def testDescribesEveryDefinition(self):
+        groups = GroupDescriber(self.gg).describeAll()
+        self.assertEqual(sorted(g['Group']['Name'] for g in groups), ['g1', 'g2'])
+        g1 = [g for g in groups if g['Group']['Name'] == 'g1'][0]
+        self.assertEqual(sorted(g1['Definitions']), sorted(g1['GroupVersion']))
+        self.assertEqual(len(g1['Definitions']['DeviceDefinitionVersionArn']['Devices']), 3)
+        self.assertEqual(len(g1['Definitions']['SubscriptionDefinitionVersionArn']['Subscriptions']), 4)
+
+    def testCachedVersionsAreNotFetchedAgain(self):
+        ids = [g['Id'] for g in self.gg.list_groups()['Groups']]
+        self.backend.reset()
+        first = GroupDescriber(self.gg, self.cache).describe(ids)
+        self.assertEqual(self.versionCalls(), 2 + 2 * 5)
+        self.backend.reset()
+        self.assertEqual(GroupDescriber(self.gg, self.cache).describe(ids), first)
+        self.assertEqual(self.versionCalls(), 0)
+        self.assertEqual(self.backend.callCounts()['greengrass.GetGroup'], 2)
+
+    def testParseVersionArn(self):
+        arn = 'arn:aws:greengrass:us-east-1:123456789012:/greengrass/definition/devices/d1/versions/v1'
+        self.assertEqual(parseVersionArn(arn), ('devices', 'd1', 'v1'))
+        self.assertIsNone(parseVersionArn(arn.replace('devices', 'unknown')))
+        self.assertIsNone(self.cache.get(arn))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import time
+import asyncio
+import threading
+import unittest
+from gardener.executor import DependencyExecutor, AsyncDependencyExecutor
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.order = []
+
+    def task(self, name, result=True, delay=0.0):
+        def run():
+            time.sleep(delay)
+            with self.lock:
+                self.order.append(name)
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return run
+
+
+class DependencyExecutorTest(unittest.TestCase):
+    def testDependenciesRunFirst(self):
+        r = Recorder()
+        executor = DependencyExecutor(4)
+        executor.add('group', r.task('group'), dependsOn=['core', 'subscriptions'])
+        executor.add('subscriptions', r.task('subscriptions'), dependsOn=['devices'])
+        executor.add('devices', r.task('devices', delay=0.02))
+        executor.add('core', r.task('core'))
+        self.assertTrue(executor.run())
+        self.assertLess(r.order.index('devices'), r.order.index('subscriptions'))
+        self.assertEqual(r.order[-1], 'group')
+
+    def testFailedTaskStopsItsDependents(self):
+        r = Recorder()
+        executor = DependencyExecutor(2)
+        executor.add('devices', r.task('devices', False))
+        executor.add('subscriptions', r.task('subscriptions'), dependsOn=['devices'])
+        self.assertFalse(executor.run())
+        self.assertEqual(r.order, ['devices'])
+
+    def testErrorIsRaisedOnceRunningTasksFinished(self):
+        r = Recorder()
+        executor = DependencyExecutor(2)
+        executor.add('core', r.task('core', RuntimeError('core failed')))
+        executor.add('devices', r.task('devices', delay=0.05))
+        executor.add('subscriptions', r.task('subscriptions'), dependsOn=['devices'])
+        with self.assertRaisesRegex(RuntimeError, 'core failed'):
+            executor.run()
+        self.assertEqual(sorted(r.order), ['core', 'devices'])
+
+    def testInvalidGraphs(self):
+        executor = DependencyExecutor()
+        executor.add('a', Recorder().task('a'))
+        with self.assertRaises(ValueError):
+            executor.add('a', Recorder().task('a'))
+        executor.add('b', Recorder().task('b'), dependsOn=['missing'])
+        with self.assertRaisesRegex(ValueError, 'undefined'):
+            executor.run()
+
+        executor = DependencyExecutor()
+        executor.add('a', Recorder().task('a'), dependsOn=['b'])
+        executor.add('b', Recorder().task('b'), dependsOn=['a'])
+        with self.assertRaisesRegex(ValueError, 'Circular'):
+            executor.run()
+
+    def testAtLeastOneWorker(self):
+        with self.assertRaises(ValueError):
+            DependencyExecutor(0)
+
+
+class AsyncDependencyExecutorTest(unittest.TestCase):
+    def testSameFailureRules(self):
+        r = Recorder()
+
+        async def run():
+            executor = AsyncDependencyExecutor(asyncio.Semaphore(1))
+            executor.add('devices', r.task('devices', False))
+            executor.add('subscriptions', r.task('subscriptions'), dependsOn=['devices'])
+            return await executor.run()
+        self.assertFalse(asyncio.run(run()))
+        self.assertEqual(r.order, ['devices'])
+
+    def testCoroutineTasksCallThroughTheSemaphore(self):
+        r = Recorder()
+
+        async def run():
+            executor = AsyncDependencyExecutor(asyncio.Semaphore(1))
+
+            # Holds no semaphore slot while its calls wait for it
+            async def provisioning():
+                return all(await asyncio.gather(*[executor.call(r.task('thing{0}'.format(i))) for i in range(3)]))
+            executor.add('provisioning', provisioning)
+            executor.add('devices', r.task('devices'), dependsOn=['provisioning'])
+            return await executor.run()
+        self.assertTrue(asyncio.run(run()))
+        self.assertEqual(sorted(r.order[:3]), ['thing0', 'thing1', 'thing2'])
+        self.assertEqual(r.order[-1], 'devices')
+
+
+if __name__ == '__main__':
+    unittest.main()
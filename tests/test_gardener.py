@@ -0,0 +1,77 @@
+import os
+import shutil
+import asyncio
+import tempfile
+import unittest
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from tests.support import REGION, makeConfig, fakeClients
+from gardener.gardener import Gardener, AsyncGardener
+from gardener.catalog import DefinitionCatalog
+from gardener.policy import PolicyRegistry
+from gardener.state import DeploymentState
+from gardener.credentials import FileCredentialStore
+
+
+class RedeployTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.backend, self.clients = fakeClients()
+        self.deploy(makeConfig())
+
+    def deploy(self, config):
+        """
+        Deploy config with the state of the previous deployments and return the calls made
+        """
+        self.backend.reset()
+        state = DeploymentState(os.path.join(self.dir, 'state.json'))
+        gardener = Gardener(config, clients=self.clients, state=state, credentials=FileCredentialStore(self.dir))
+        self.assertIn('coreThing', gardener.createGreengrass())
+        return self.backend.callCounts()
+
+    def testUnchangedRedeployOnlyDeploys(self):
+        self.assertEqual(self.deploy(makeConfig()), Counter({'greengrass.CreateDeployment': 1}))
+
+    def testRouteChangeDoesNotCallIot(self):
+        config = makeConfig()
+        config.Routes[0]['Subject'] = 'data/changed'
+        calls = self.deploy(config)
+        self.assertEqual([k for k in calls if k.startswith('iot.')], [])
+        self.assertEqual(calls['greengrass.CreateSubscriptionDefinitionVersion'], 1)
+        self.assertEqual(calls['greengrass.CreateGroupVersion'], 1)
+        self.assertEqual(calls['greengrass.CreateDeviceDefinitionVersion'], 0)
+        self.assertEqual(calls['greengrass.CreateDeployment'], 1)
+
+    def testThingChangeProvisionsOnlyThatThing(self):
+        config = makeConfig()
+        config.Things['thing2']['name'] = 'g1_renamed'
+        calls = self.deploy(config)
+        self.assertEqual(calls['iot.CreateThing'], 1)
+        self.assertEqual(calls['iot.CreateKeysAndCertificate'], 1)
+        self.assertEqual(calls['greengrass.CreateDeviceDefinitionVersion'], 1)
+
+
+class AsyncGardenerTest(unittest.TestCase):
+    def testGroupsShareOneSlotAndOneThread(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        backend, clients = fakeClients()
+        catalog = DefinitionCatalog(clients.client('greengrass', REGION))
+        policies = PolicyRegistry(clients.client('iot', REGION))
+        executor = ThreadPoolExecutor(1)
+        self.addCleanup(executor.shutdown)
+
+        async def deploy():
+            semaphore = asyncio.Semaphore(1)
+            gardeners = [AsyncGardener(makeConfig('g{0}'.format(i), things=5), semaphore, executor, clients, catalog, policies,
+                credentials=FileCredentialStore(directory)) for i in range(3)]
+            return await asyncio.wait_for(asyncio.gather(*[g.createGreengrass() for g in gardeners]), 30)
+        self.assertTrue(all('coreThing' in x for x in asyncio.run(deploy())))
+        calls = backend.callCounts()
+        self.assertEqual(calls['iot.CreateThing'], 3 * 6)
+        self.assertEqual(calls['greengrass.CreateDeployment'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
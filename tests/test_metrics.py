@@ -0,0 +1,54 @@
+import shutil
+import tempfile
+import unittest
+from botocore.exceptions import ClientError
+from tests.support import makeConfig
+from gardener.fake import FakeBackend
+from gardener.clients import ClientRegistry
+from gardener.gardener import Gardener
+from gardener.metrics import Metrics, Histogram
+from gardener.credentials import FileCredentialStore
+
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics()
+
+    def clients(self, backend):
+        return ClientRegistry(factory=backend.factory, metrics=self.metrics)
+
+    def testCallsErrorsAndRetriesPerOperation(self):
+        backend = FakeBackend(throttleRate=0.3, seed=2)
+        iot = self.clients(backend).client('iot', 'test-operations')
+        for i in range(10):
+            iot.create_thing(thingName='thing{0}'.format(i))
+        backend.throttleRate = 0.0
+        with self.assertRaises(ClientError):
+            iot.get_policy(policyName='missing')
+        operations = self.metrics.toDict()['operations']
+        created = operations['iot.CreateThing']
+        throttled = len(backend.calls) - 10 - 1
+        self.assertEqual((created['calls'], created['errors'], created['retries']), (10 + throttled, throttled, throttled))
+        self.assertEqual(created['latency']['count'], created['calls'])
+        self.assertEqual((operations['iot.GetPolicy']['calls'], operations['iot.GetPolicy']['errors']), (1, 1))
+
+    def testDeploymentPhases(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        Gardener(makeConfig(), clients=self.clients(FakeBackend()), credentials=FileCredentialStore(directory)).createGreengrass()
+        phases = self.metrics.toDict()['phases']['g1']
+        self.assertEqual(sorted(phases), ['core', 'deployment', 'devices', 'functions', 'group', 'loggers', 'subscriptions'])
+        text = self.metrics.toPrometheus()
+        self.assertIn('gardener_api_calls_total{service="greengrass",operation="CreateDeployment"} 1', text)
+        self.assertIn('gardener_phase_seconds{group="g1",phase="deployment"}', text)
+
+    def testHistogramBuckets(self):
+        histogram = Histogram((0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative(), [(0.1, 2), (1.0, 3), ('+Inf', 4)])
+        self.assertEqual(histogram.max, 2.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import json
+import unittest
+from tests.support import REGION, POLICY, fakeClients
+from gardener.policy import PolicyRegistry, MAX_POLICY_VERSIONS
+
+
+def document(i):
+    return dict(POLICY, Statement=[{"Effect": "Allow", "Action": ["iot:Publish"], "Resource": ["topic/{0}".format(i)]}])
+
+
+class PolicyRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.backend, clients = fakeClients()
+        self.iot = clients.client('iot', REGION)
+
+    def ensure(self, doc):
+        """
+        Resolve the policy in a new run, with the registry of that run
+        """
+        self.backend.reset()
+        return PolicyRegistry(self.iot).ensure('p_Policy', doc)
+
+    def testCreatedOncePerRun(self):
+        registry = PolicyRegistry(self.iot)
+        arn = registry.ensure('p_Policy', POLICY)
+        self.assertEqual(registry.ensure('p_Policy', dict(POLICY)), arn)
+        self.assertEqual(self.backend.callCounts()['iot.CreatePolicy'], 1)
+        self.assertEqual(self.backend.callCounts()['iot.ListPolicies'], 1)
+
+    def testUnchangedPolicyIsReused(self):
+        arn = self.ensure(POLICY)
+        self.assertEqual(self.ensure(POLICY), arn)
+        self.assertEqual(self.backend.callCounts()['iot.CreatePolicyVersion'], 0)
+
+    def testChangedPolicyGetsNewDefaultVersion(self):
+        arn = self.ensure(POLICY)
+        self.assertEqual(self.ensure(document(1)), arn)
+        self.assertEqual(self.backend.callCounts()['iot.CreatePolicyVersion'], 1)
+        self.assertEqual(json.loads(self.iot.get_policy(policyName='p_Policy')['policyDocument']), document(1))
+
+    def testOldestVersionIsDeletedAtTheLimit(self):
+        self.ensure(POLICY)
+        for i in range(1, MAX_POLICY_VERSIONS):
+            self.ensure(document(i))
+        self.assertEqual(self.backend.callCounts()['iot.DeletePolicyVersion'], 0)
+        self.ensure(document(MAX_POLICY_VERSIONS))
+        self.assertEqual(self.backend.callCounts()['iot.DeletePolicyVersion'], 1)
+        versions = self.iot.list_policy_versions(policyName='p_Policy')['policyVersions']
+        self.assertEqual(len(versions), MAX_POLICY_VERSIONS)
+        self.assertNotIn('1', [v['versionId'] for v in versions])
+        self.assertEqual([v['versionId'] for v in versions if v['isDefaultVersion']], [str(MAX_POLICY_VERSIONS + 1)])
+
+    def testConflictingDocumentsAreRefused(self):
+        registry = PolicyRegistry(self.iot)
+        registry.ensure('p_Policy', POLICY)
+        with self.assertRaisesRegex(ValueError, 'p_Policy'):
+            registry.ensure('p_Policy', document(1))
+        self.assertEqual(self.backend.callCounts()['iot.CreatePolicyVersion'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
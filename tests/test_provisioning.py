@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import unittest
+from tests.support import REGION, makeConfig
+from gardener.fake import FakeBackend
+from gardener.clients import ClientRegistry
+from gardener.thing import Thing
+from gardener.provisioning import BulkProvisioner
+from gardener.credentials import FileCredentialStore
+from gardener.globals import KEY_POSTFIX
+
+BULK_REGISTRATION = {'bucket': 'registrations', 'roleArn': 'arn:aws:iam::123456789012:role/registration'}
+
+
+class BulkRegistrationTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        # Small pages, so that every list call spans several of them
+        self.backend = FakeBackend(pageSize=2)
+        self.clients = ClientRegistry(factory=self.backend.factory)
+        self.iot = self.clients.client('iot', REGION)
+        self.config = makeConfig(things=8)
+
+    def provision(self, things, bulkRegistration=None):
+        credentials = FileCredentialStore(self.dir)
+        try:
+            thing = Thing(self.config, clients=self.clients, credentials=credentials)
+            provisioner = BulkProvisioner(thing, 2, bulkRegistration)
+            return provisioner.provision(things), provisioner.errors
+        finally:
+            credentials.close()
+
+    def testRegistersOnlyNewThings(self):
+        things = list(self.config.iterThings())
+        self.provision(things[:5])
+        self.backend.reset()
+        provisioned, errors = self.provision(things, BULK_REGISTRATION)
+        self.assertEqual(errors, {})
+        self.assertEqual(list(provisioned), [k for k, v in things])
+        # The existing things keep their certificate, the new ones are registered in one task
+        self.assertEqual(self.backend.callCounts()['iot.StartThingRegistrationTask'], 1)
+        self.assertEqual(self.backend.callCounts()['iot.CreateKeysAndCertificate'], 0)
+        for k, v in things:
+            self.assertEqual(len(self.iot.list_thing_principals(thingName=v['name'])['principals']), 1, k)
+
+    def testKeysOfEveryReportPageAreStored(self):
+        things = list(self.config.iterThings())
+        provisioned, errors = self.provision(things, BULK_REGISTRATION)
+        self.assertEqual(errors, {})
+        self.assertEqual(len(provisioned), len(things))
+        for k, v in things:
+            with open(os.path.join(self.dir, v['name'] + KEY_POSTFIX)) as f:
+                self.assertIn('PRIVATE KEY', f.read())
+            self.assertEqual(provisioned[k].certArn, self.iot.list_thing_principals(thingName=v['name'])['principals'][0])
+        self.assertEqual(self.clients.client('s3', REGION).objects, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
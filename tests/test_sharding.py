@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+from tests.support import makeConfig
+from gardener.sharding import ShardPlan, shardName
+
+
+def writeCsv(directory, rows):
+    path = os.path.join(directory, 'things.csv')
+    with open(path, 'w') as f:
+        f.write('serial,site\n')
+        for serial, site in rows:
+            f.write('{0},{1}\n'.format(serial, site))
+    return path
+
+
+class ShardPlanTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def siteConfig(self, rows):
+        config = makeConfig(things=0)
+        config.addThingTemplate('sensors', 's{serial}', 'g1_{site}_{serial}', 'thing_policy', csv=writeCsv(self.dir, rows))
+        return config
+
+    def testSmallConfigIsNotSplit(self):
+        plan = ShardPlan(makeConfig(things=3), maxThings=3)
+        self.assertEqual(plan.count, 1)
+        self.assertEqual(plan.things, {})
+
+    def testThingsSplitInConfigOrder(self):
+        config = makeConfig(things=5)
+        config.Routes = [r for r in config.Routes if r['Source'] != 'GGShadowService']
+        plan = ShardPlan(config, maxThings=2)
+        self.assertEqual(plan.count, 3)
+        self.assertEqual([plan.shardOf('thing{0}'.format(i)) for i in range(5)], [0, 0, 1, 1, 2])
+        self.assertEqual(list(plan.shardConfig(1).Things), ['thing2', 'thing3'])
+        self.assertEqual([r['Source'] for r in plan.shardConfig(2).Routes], ['thing:thing4'])
+
+    def testKeyKeepsThingsTogether(self):
+        config = self.siteConfig([(1, 'a'), (2, 'b'), (3, 'a'), (4, 'b'), (5, 'b')])
+        plan = ShardPlan(config, maxThings=3, key='{site}')
+        self.assertEqual(plan.count, 2)
+        self.assertEqual(sorted(plan.shardConfig(0).Things), ['s1', 's3'])
+        self.assertEqual(sorted(plan.shardConfig(1).Things), ['s2', 's4', 's5'])
+
+    def testKeyLargerThanAShardIsSplit(self):
+        config = self.siteConfig([(i, 'a') for i in range(5)])
+        plan = ShardPlan(config, maxThings=2, key='{site}')
+        self.assertEqual(plan.count, 3)
+        self.assertEqual([len(plan.shardConfig(i).Things) for i in range(3)], [2, 2, 1])
+
+    def testUnknownKeyVariable(self):
+        config = self.siteConfig([(1, 'a'), (2, 'b')])
+        with self.assertRaisesRegex(ValueError, 'floor'):
+            ShardPlan(config, maxThings=1, key='{floor}')
+
+    def testCrossShardRoutesAreRejected(self):
+        config = makeConfig(things=4)
+        config.addRoute('thing:thing0', 'relay', 'thing:thing3')
+        with self.assertRaisesRegex(ValueError, 'spans shards'):
+            ShardPlan(config, maxThings=2)
+
+    def testShadowRoutesFollowTheirThing(self):
+        config = makeConfig(things=4)
+        plan = ShardPlan(config, maxThings=2)
+        shadow = [r for r in plan.shardConfig(0).Routes if r['Source'] == 'GGShadowService']
+        self.assertEqual(len(shadow), 1)
+        self.assertFalse(any(r['Source'] == 'GGShadowService' for r in plan.shardConfig(1).Routes))
+
+    def testRoutesWithoutThingsGoToEveryShard(self):
+        config = makeConfig(things=4)
+        config.addRoute('lambda:collector', 'alerts', 'cloud')
+        plan = ShardPlan(config, maxThings=2)
+        for i in range(plan.count):
+            self.assertIn('alerts', [r['Subject'] for r in plan.shardConfig(i).Routes])
+
+    def testShardNames(self):
+        plan = ShardPlan(makeConfig(things=4), maxThings=2)
+        config = plan.shardConfig(1)
+        self.assertEqual(config.Group['name'], shardName('g1', 1))
+        self.assertEqual(list(config.Cores), [shardName('core', 1)])
+        self.assertEqual(plan.shardConfig(0).Group['name'], 'g1')
+
+
+if __name__ == '__main__':
+    unittest.main()
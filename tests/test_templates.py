@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+import unittest
+from tests.support import makeConfig, fakeClients
+from gardener.templates import ThingTemplate, RouteTemplate
+from gardener.gardener import Gardener
+from gardener.plan import sectionFingerprints
+from gardener.credentials import FileCredentialStore
+
+
+class ThingTemplateTest(unittest.TestCase):
+    def testRange(self):
+        template = ThingTemplate('sensors', {'id': 'sensor{i:02d}', 'name': 'site1_{id}', 'range': [0, 3], 'policy': 'p', 'syncShadow': True})
+        records = list(template.records())
+        self.assertEqual([k for k, v in records], ['sensor00', 'sensor01', 'sensor02'])
+        self.assertEqual(records[1][1], {'i': 1, 'name': 'site1_sensor01', 'syncShadow': True, 'policy': 'p'})
+
+    def testCsvColumnsAreVariables(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with open(os.path.join(directory, 'things.csv'), 'w') as f:
+            f.write('serial,site\nA1,north\nB2,south\n')
+        template = ThingTemplate('sensors', {'id': '{site}_{serial}', 'name': 'g_{id}', 'csv': 'things.csv', 'policy': 'p'}, directory)
+        records = dict(template.records())
+        self.assertEqual(list(records), ['north_A1', 'south_B2'])
+        self.assertEqual(records['south_B2']['site'], 'south')
+        self.assertEqual(records['south_B2']['name'], 'g_south_B2')
+
+    def testInvalidTemplates(self):
+        with self.assertRaisesRegex(ValueError, 'requires id, name and policy'):
+            ThingTemplate('t', {'id': '{i}', 'name': '{i}', 'range': [0, 1]})
+        with self.assertRaisesRegex(ValueError, 'either range or csv'):
+            ThingTemplate('t', {'id': '{i}', 'name': '{i}', 'policy': 'p', 'range': [0, 1], 'csv': 'x.csv'})
+
+    def testRouteTemplate(self):
+        things = {'sensors': ThingTemplate('sensors', {'id': 's{i}', 'name': 'n{i}', 'range': [0, 2], 'policy': 'p'})}
+        template = RouteTemplate({'forEach': 'sensors', 'Source': 'thing:{id}', 'Subject': 'data/{name}', 'Target': 'cloud'}, things)
+        self.assertEqual(list(template.records()), [
+            {'Source': 'thing:s0', 'Subject': 'data/n0', 'Target': 'cloud'},
+            {'Source': 'thing:s1', 'Subject': 'data/n1', 'Target': 'cloud'}
+        ])
+        with self.assertRaisesRegex(ValueError, 'unknown thing template'):
+            RouteTemplate({'forEach': 'missing'}, things)
+
+
+class ConfigTemplateTest(unittest.TestCase):
+    def config(self):
+        config = makeConfig(things=1)
+        config.addThingTemplate('sensors', 'sensor{i}', 'g1_sensor{i}', 'thing_policy', range=(0, 3))
+        return config
+
+    def testThingsAreExpandedWithTheInlineOnes(self):
+        config = self.config()
+        self.assertEqual([k for k, v in config.iterThings()], ['thing0', 'sensor0', 'sensor1', 'sensor2'])
+        self.assertEqual(config.Things['sensor2']['name'], 'g1_sensor2')
+
+    def testRouteTemplatesAreChecked(self):
+        config = self.config()
+        config.addRouteTemplate('sensors', 'thing:{id}', 'data/{i}', 'lambda:collector')
+        config.checkRouteTemplates()
+        self.assertEqual(len(list(config.iterRoutes())), 1 + 3)
+
+        config.addRouteTemplate('sensors', 'thing:{id}', 'data/{i}', 'lambda:missing')
+        with self.assertRaisesRegex(ValueError, 'Route template 1 \\(forEach sensors\\): 3 invalid routes'):
+            config.checkRouteTemplates()
+
+    def testDeployStreamsTemplateRoutes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        backend, clients = fakeClients()
+        config = self.config()
+        config.addRouteTemplate('sensors', 'thing:{id}', 'data/{i}', 'lambda:collector')
+        fingerprint = sectionFingerprints(config)['Routes']
+        Gardener(config, clients=clients, credentials=FileCredentialStore(directory)).createGreengrass()
+        # Neither the plan nor the subscription definition loaded the generated routes
+        self.assertIn('Routes', config._shards)
+        self.assertEqual(len(config._sections['Routes']), 1)
+        calls = [p for s, o, p in backend.calls if o == 'CreateSubscriptionDefinitionVersion']
+        self.assertEqual(len(calls[0]['Subscriptions']), 1 + 3)
+
+        config.addRouteTemplate('sensors', 'thing:{id}', 'alerts/{i}', 'cloud')
+        self.assertNotEqual(sectionFingerprints(config)['Routes'], fingerprint)
+
+
+if __name__ == '__main__':
+    unittest.main()
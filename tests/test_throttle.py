@@ -0,0 +1,70 @@
+import unittest
+from botocore.exceptions import ClientError
+from gardener.fake import FakeBackend
+from gardener.throttle import TokenBucket, RateLimitedClient, allStats
+from gardener.clients import ClientRegistry
+from gardener.metrics import Metrics
+
+
+class RateLimitedClientTest(unittest.TestCase):
+    def client(self, region, throttleRate=0.0, **params):
+        """
+        Limited IoT client of the fake backend, each test uses its own region and so its own counters
+        """
+        self.backend = FakeBackend(throttleRate=throttleRate, seed=1)
+        return RateLimitedClient(self.backend.factory('iot', region), 'iot', region, baseDelay=0.001, **params)
+
+    def testThrottledCallsAreRetried(self):
+        iot = self.client('test-retried', 0.3)
+        for i in range(20):
+            iot.create_thing(thingName='thing{0}'.format(i))
+        stats = allStats()['iot/test-retried']
+        throttled = len(self.backend.calls) - 20
+        self.assertGreater(throttled, 0)
+        self.assertEqual((stats['calls'], stats['retries'], stats['throttled'], stats['errors']), (20 + throttled, throttled, throttled, 0))
+        self.assertGreater(stats['backoffWait'], 0)
+
+    def testOtherErrorsAreNotRetried(self):
+        iot = self.client('test-failed')
+        with self.assertRaises(ClientError):
+            iot.get_policy(policyName='missing')
+        self.assertEqual(len(self.backend.calls), 1)
+        self.assertEqual(allStats()['iot/test-failed']['errors'], 1)
+
+    def testGivesUpAfterMaxAttempts(self):
+        iot = self.client('test-exhausted', 1.0, maxAttempts=3)
+        with self.assertRaises(ClientError):
+            iot.list_things()
+        self.assertEqual(len(self.backend.calls), 3)
+
+    def testLimiterCountersAreInTheMetrics(self):
+        iot = self.client('test-metrics')
+        iot.list_things()
+        report = Metrics(allStats)
+        self.assertEqual(report.toDict()['limiters']['iot/test-metrics']['calls'], 1)
+        self.assertIn('gardener_limiter_calls_total{service="iot",region="test-metrics"} 1', report.toPrometheus())
+
+
+class TokenBucketTest(unittest.TestCase):
+    def testWaitsOnceTheBurstIsUsed(self):
+        bucket = TokenBucket(50, 2)
+        self.assertEqual(bucket.acquire() + bucket.acquire(), 0)
+        self.assertGreater(bucket.acquire(), 0)
+
+    def testThrottlingLowersTheRateOncePerSecond(self):
+        bucket = TokenBucket(10, 10)
+        bucket.throttled()
+        bucket.throttled()
+        self.assertAlmostEqual(bucket.rate, 7.0)
+        bucket.succeeded()
+        self.assertAlmostEqual(bucket.rate, 7.5)
+
+
+class BotocoreRetriesTest(unittest.TestCase):
+    def testBotocoreMakesASingleAttempt(self):
+        retries = ClientRegistry()._createClient('iot', 'us-east-1').meta.config.retries
+        self.assertEqual(retries.get('total_max_attempts', retries.get('max_attempts', 0) + 1), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
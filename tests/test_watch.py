@@ -0,0 +1,55 @@
+import io
+import json
+import shutil
+import tempfile
+import unittest
+from tests.support import REGION, makeConfig, fakeClients
+from gardener.gardener import Gardener
+from gardener.watch import DeploymentWatcher, NOT_FOUND, NO_DEPLOYMENT, POLL_FAILED
+from gardener.credentials import FileCredentialStore
+
+
+class FailingStatus:
+    """
+    Greengrass client whose deployment status calls fail
+    """
+    def __init__(self, gg):
+        self.gg = gg
+
+    def __getattr__(self, name):
+        return getattr(self.gg, name)
+
+    def get_deployment_status(self, **params):
+        raise RuntimeError('status unavailable')
+
+
+class DeploymentWatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.backend, clients = fakeClients()
+        for name, deploy in (('deployed', True), ('created', False)):
+            Gardener(makeConfig(name, deploy=deploy), clients=clients, credentials=FileCredentialStore(self.dir)).createGreengrass()
+        self.gg = clients.client('greengrass', REGION)
+
+    def watch(self, gg, groups, **params):
+        out = io.StringIO()
+        statuses = DeploymentWatcher(gg, groups, minInterval=0.001, maxInterval=0.01, out=out, **params).watch(timeout=10)
+        return statuses, [json.loads(l) for l in out.getvalue().splitlines()]
+
+    def testFollowsLatestDeployment(self):
+        statuses, events = self.watch(self.gg, ['deployed', 'created', 'missing'])
+        self.assertEqual(statuses, {'deployed': 'Success', 'created': NO_DEPLOYMENT, 'missing': NOT_FOUND})
+        deployed = [e for e in events if e['group'] == 'deployed']
+        self.assertEqual([e['status'] for e in deployed], ['Building', 'InProgress', 'Success'])
+        self.assertIsNotNone(deployed[0]['deploymentId'])
+
+    def testGivesUpAfterRepeatedErrors(self):
+        statuses, events = self.watch(FailingStatus(self.gg), ['deployed'], maxErrors=3)
+        self.assertEqual(statuses, {'deployed': POLL_FAILED})
+        self.assertEqual(len(events), 3)
+        self.assertTrue(all(e['pollError'] == 'status unavailable' for e in events))
+
+
+if __name__ == '__main__':
+    unittest.main()